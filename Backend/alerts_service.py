@@ -5,33 +5,129 @@ and return GeoJSON for mapping (by published date or last N days).
 """
 import os
 import json
+import base64
+import hashlib
 from datetime import datetime, timedelta
 from typing import List, Optional
 from fastapi import Path
 from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 from uuid import UUID
-from fastapi import FastAPI, HTTPException, Query, Depends
+from fastapi import FastAPI, HTTPException, Query, Depends, Header, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from pydantic import BaseModel
-from sqlalchemy import create_engine, select, func, text
+from sqlalchemy import create_engine, select, func, text, and_, or_, tuple_, case, cast, update
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
 from geoalchemy2.functions import ST_AsGeoJSON
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Text, DateTime, Numeric, JSON
+from sqlalchemy import Column, Text, DateTime, Numeric, JSON, Integer
 from sqlalchemy import func
 from dotenv import load_dotenv
-import requests
+import httpx
+
+from response_cache import ResponseCache
 # ─── Load environment & set up DB ─────────────────────────────────────────────
 load_dotenv()
 DATABASE_URL = os.getenv("PG_DSN")
 if not DATABASE_URL:
     raise RuntimeError("PG_DSN must be set in .env")
 
-engine = create_engine(DATABASE_URL, echo=False)
+# DB_ASYNC=1 serves the stats/map endpoints through asyncpg
+DB_ASYNC = os.getenv("DB_ASYNC", "0") == "1"
+# asyncpg prepared statements per connection (0 behind a transaction-mode pgbouncer)
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+
+# Pool tuning; pre-ping + recycle survive Neon closing idle connections.
+# DB_POOL_SIZE / DB_MAX_OVERFLOW are the whole per-worker budget: with
+# DB_ASYNC=1 the async engine takes DB_ASYNC_POOL_SIZE / DB_ASYNC_MAX_OVERFLOW
+# of it (half by default) and the sync engine keeps the rest.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+ASYNC_POOL_SIZE = int(os.getenv("DB_ASYNC_POOL_SIZE", str(DB_POOL_SIZE // 2))) if DB_ASYNC else 0
+ASYNC_MAX_OVERFLOW = int(os.getenv("DB_ASYNC_MAX_OVERFLOW", str(DB_MAX_OVERFLOW // 2))) if DB_ASYNC else 0
+
+
+def pool_options(pool_size: int, max_overflow: int) -> dict:
+    return dict(
+        pool_size=max(1, pool_size),
+        max_overflow=max(0, max_overflow),
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "300")),
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        pool_pre_ping=True,
+    )
+
+
+engine = create_engine(
+    DATABASE_URL, echo=False,
+    **pool_options(DB_POOL_SIZE - ASYNC_POOL_SIZE,
+                   DB_MAX_OVERFLOW - ASYNC_MAX_OVERFLOW),
+)
 SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
 Base = declarative_base()
 
 
+def make_async_engine(url: str):
+    """
+    asyncpg engine for the same database: libpq-only query options
+    (sslmode, channel_binding) are translated or dropped.
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    u = make_url(url)
+    query = dict(u.query)
+    sslmode = query.pop("sslmode", None)
+    query.pop("channel_binding", None)
+    query["prepared_statement_cache_size"] = str(DB_STATEMENT_CACHE_SIZE)
+    connect_args = {}
+    if sslmode and sslmode != "disable":
+        connect_args["ssl"] = "require"
+    u = u.set(drivername="postgresql+asyncpg", query=query)
+    return create_async_engine(
+        u, connect_args=connect_args,
+        **pool_options(ASYNC_POOL_SIZE, ASYNC_MAX_OVERFLOW),
+    )
+
+
+async_engine = make_async_engine(DATABASE_URL) if DB_ASYNC else None
+
+
+class Database:
+    """
+    Read-only query runner for the hot dashboard endpoints: awaits the
+    asyncpg engine when DB_ASYNC is set, otherwise runs the sync engine
+    in the threadpool. Either way the event loop is never blocked.
+    """
+
+    async def _run(self, stmt, params, method):
+        if async_engine is not None:
+            async with async_engine.connect() as conn:
+                result = await conn.execute(stmt, params or {})
+                return getattr(result, method)()
+
+        def run():
+            with engine.connect() as conn:
+                return getattr(conn.execute(stmt, params or {}), method)()
+        return await run_in_threadpool(run)
+
+    async def all(self, stmt, params=None):
+        return await self._run(stmt, params, "all")
+
+    async def one(self, stmt, params=None):
+        return await self._run(stmt, params, "one")
+
+    async def scalar(self, stmt, params=None):
+        return await self._run(stmt, params, "scalar")
+
+
+database = Database()
+
+
+def get_database():
+    return database
+
+
 #sql
 class Alert(Base):
     __tablename__ = "alerts"
@@ -49,6 +145,9 @@ class Alert(Base):
     severity_band  = Column(Text)
     language       = Column(Text)
     image_url      = Column(Text)
+    tone           = Column(JSON)
+    tone_attempts  = Column(Integer, nullable=False, default=0)
+    tone_failed_at = Column(DateTime(timezone=True))
 
 
 #pydantic model
@@ -80,6 +179,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 
@@ -90,25 +190,194 @@ def get_db():
     finally:
         db.close()
 
-TONE_SERVICE_URL = "http://localhost:8002/infer" 
 
-def infer_tone(title: str, summary: str):
+# ─── Response cache: invalidated whenever a newer fetched_at is ingested ──────
+response_cache = ResponseCache(
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "30")),
+    version_ttl=float(os.getenv("RESPONSE_CACHE_VERSION_TTL", "2")),
+    shared_dir=os.getenv("RESPONSE_CACHE_DIR") or None,
+    maxsize=int(os.getenv("RESPONSE_CACHE_SIZE", "1024")),
+)
+
+
+# alerts_ingest.seq is bumped by every insert batch (rollups.apply_rollups),
+# so rows ingested late with an older fetched_at still change the version
+DATA_VERSION_SQL = text("""
+  SELECT (SELECT seq FROM alerts_ingest WHERE id = 1),
+         (SELECT max(fetched_at) FROM alerts)
+""")
+
+
+async def data_version(db):
+    return tuple(await db.one(DATA_VERSION_SQL))
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    return response_cache.stats
+
+TONE_SERVICE_URL = os.getenv("TONE_SERVICE_URL", "http://localhost:8002/infer")
+TONE_PENDING = {"status": "pending"}
+# same failure accounting as tone_worker.py: back off, then give up
+TONE_MAX_ATTEMPTS = int(os.getenv("TONE_MAX_ATTEMPTS", "5"))
+TONE_RETRY_SECONDS = float(os.getenv("TONE_RETRY_SECONDS", "300"))
+
+# pooled client shared by all requests, created on first use
+_tone_client = None
+# alerts whose tone is being computed right now
+_tone_in_flight = set()
+
+
+def tone_client() -> httpx.AsyncClient:
+    global _tone_client
+    if _tone_client is None:
+        _tone_client = httpx.AsyncClient(
+            timeout=30,
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=10),
+        )
+    return _tone_client
+
+
+async def infer_tone(title: str, summary: str):
     try:
         full_text = f"{title} {summary}"
-        response = requests.post(TONE_SERVICE_URL, json={"text": full_text}, timeout=30)
-        if response.ok:
+        response = await tone_client().post(TONE_SERVICE_URL, json={"text": full_text})
+        if response.is_success:
             return response.json()
     except Exception as e:
         print(f"Tone Service error: {e}")
     return None
 
-@app.get("/alerts", response_model=List[AlertOut])
+
+def store_tone(alert_id: str, tone: dict):
+    with SessionLocal() as db:
+        db.execute(update(Alert).where(Alert.id == alert_id).values(tone=tone))
+        db.commit()
+
+
+def record_tone_failure(alert_id: str):
+    with SessionLocal() as db:
+        db.execute(
+            update(Alert).where(Alert.id == alert_id).values(
+                tone_attempts=Alert.tone_attempts + 1,
+                tone_failed_at=func.now(),
+            )
+        )
+        db.commit()
+
+
+def tone_due(attempts: int, failed_at) -> bool:
+    """Whether a tone attempt may run now, given the alert's past failures."""
+    if attempts >= TONE_MAX_ATTEMPTS:
+        return False
+    if failed_at is None:
+        return True
+    retry_at = failed_at + timedelta(seconds=TONE_RETRY_SECONDS * attempts)
+    return datetime.now(failed_at.tzinfo) >= retry_at
+
+
+async def backfill_tone(alert_id: str, title: str, summary: str):
+    """Compute and store the tone of one alert (runs after the response)."""
+    try:
+        tone = await infer_tone(title, summary)
+        if tone:
+            await run_in_threadpool(store_tone, alert_id, tone)
+        else:
+            await run_in_threadpool(record_tone_failure, alert_id)
+    finally:
+        _tone_in_flight.discard(alert_id)
+
+# Alert columns plus lon/lat pulled out of geom in the same query
+ALERT_COLUMNS = (
+    Alert.id, Alert.new_id, Alert.source, Alert.title, Alert.summary,
+    Alert.published_at, Alert.violence_score, Alert.fetched_at,
+    Alert.entities, Alert.activities, Alert.severity_band,
+    Alert.language, Alert.image_url,
+    func.ST_X(text("alerts.geom")).label("lon"),
+    func.ST_Y(text("alerts.geom")).label("lat"),
+)
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def alert_row(row) -> dict:
+    """
+    Turn one ALERT_COLUMNS row into the JSON-ready shape of AlertOut
+    without building ORM or Pydantic objects.
+    """
+    r = row._mapping
+    return {
+        "id":             r["id"],
+        "new_id":         str(r["new_id"]),
+        "source":         r["source"],
+        "title":          r["title"],
+        "summary":        r["summary"],
+        "published_at":   _iso(r["published_at"]),
+        "violence_score": float(r["violence_score"]) if r["violence_score"] is not None else None,
+        "fetched_at":     _iso(r["fetched_at"]),
+        "entities":       r["entities"],
+        "activities":     r["activities"],
+        "severity_band":  r["severity_band"],
+        "language":       r["language"],
+        "image_url":      r["image_url"],
+        "lon":            r["lon"],
+        "lat":            r["lat"],
+    }
+
+
+def encode_cursor(row) -> str:
+    """Opaque keyset cursor for the (published_at, id) of `row`."""
+    key = [row["published_at"], row["id"]]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        published_at, id_ = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (datetime.fromisoformat(published_at) if published_at else None), id_
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def after_cursor(cursor: str):
+    """
+    WHERE clause for rows after `cursor` in
+    ORDER BY published_at DESC NULLS LAST, id DESC.
+    """
+    published_at, id_ = decode_cursor(cursor)
+    if published_at is None:
+        return and_(Alert.published_at.is_(None), Alert.id < id_)
+    return or_(
+        tuple_(Alert.published_at, Alert.id) < tuple_(published_at, id_),
+        Alert.published_at.is_(None),
+    )
+
+
+def stream_ndjson(stmt):
+    """
+    Yield one JSON line per row from a server-side cursor. Uses its own
+    session so it outlives the request dependency.
+    """
+    with SessionLocal() as session:
+        result = session.execute(
+            stmt.execution_options(stream_results=True, yield_per=500)
+        )
+        for row in result:
+            yield json.dumps(alert_row(row)) + "\n"
+
+
+@app.get("/alerts", responses={200: {"model": List[AlertOut]}})
 def list_alerts(
     date: Optional[str] = Query(None, description="YYYY-MM-DD filter on published_at"),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    format: str = Query("json", pattern="^(json|ndjson)$",
+                        description="ndjson streams every row after the cursor (limit ignored)"),
     db=Depends(get_db),
 ):
-    stmt = select(Alert)
+    stmt = select(*ALERT_COLUMNS)
     if date:
         try:
             dt = datetime.fromisoformat(date)
@@ -119,24 +388,18 @@ def list_alerts(
             Alert.published_at >= dt,
             Alert.published_at   < next_day
         )
-    results = db.execute(stmt.order_by(Alert.published_at.desc()).limit(limit)).scalars().all()
-
-    out = []
-    for a in results:
-        # delete lon/lat from stored geom
-        lon = lat = None
-        if a.geom:
-            gj = db.execute(
-                select(ST_AsGeoJSON(text("alerts.geom"))).where(Alert.id == a.id)
-            ).scalar_one_or_none()
-            if gj:
-                coords = json.loads(gj).get("coordinates", [None, None])
-                lon, lat = coords[0], coords[1]
-
-        rec = AlertOut.from_orm(a).dict()
-        rec.update({"lon": lon, "lat": lat})
-        out.append(rec)
-    return out
+    if cursor:
+        stmt = stmt.where(after_cursor(cursor))
+    stmt = stmt.order_by(Alert.published_at.desc().nulls_last(), Alert.id.desc())
+
+    if format == "ndjson":
+        return StreamingResponse(stream_ndjson(stmt), media_type="application/x-ndjson")
+
+    out = [alert_row(r) for r in db.execute(stmt.limit(limit)).all()]
+    headers = {}
+    if len(out) == limit:
+        headers["X-Next-Cursor"] = encode_cursor(out[-1])
+    return JSONResponse(out, headers=headers)
 
 # @app.get("/alerts/{alert_id}", response_model=AlertOut)
 # def get_alert(alert_id: str, db=Depends(get_db)):
@@ -161,136 +424,282 @@ def list_alerts(
 
 
 @app.get("/alerts/{new_id}")
-def get_alert(new_id: str, db=Depends(get_db)):
-    a = db.execute(select(Alert).where(Alert.new_id == new_id)).scalar_one_or_none()
-    if not a:
+def get_alert(new_id: str, background_tasks: BackgroundTasks, db=Depends(get_db)):
+    row = db.execute(
+        select(*ALERT_COLUMNS, Alert.tone, Alert.tone_attempts, Alert.tone_failed_at)
+        .where(Alert.new_id == new_id)
+    ).first()
+    if not row:
         raise HTTPException(404, detail="Alert not found")
 
-    lon = lat = None
-    if a.geom:
-        gj = db.execute(
-            select(ST_AsGeoJSON(text("alerts.geom"))).where(Alert.id == a.id)
-        ).scalar_one_or_none()
-        if gj:
-            coords = json.loads(gj)["coordinates"]
-            lon, lat = coords[0], coords[1]
+    rec = alert_row(row)
 
-    rec = AlertOut.from_orm(a).dict()
-    rec.update({"lon": lon, "lat": lat})
+    # Tone is stored once per alert (see tone_worker.py); if it isn't there
+    # yet, answer "pending" now and compute it in the background unless
+    # recent attempts failed
+    rec["tone"] = row.tone or TONE_PENDING
+    if (not row.tone and rec["id"] not in _tone_in_flight
+            and tone_due(row.tone_attempts or 0, row.tone_failed_at)):
+        _tone_in_flight.add(rec["id"])
+        background_tasks.add_task(backfill_tone, rec["id"], rec["title"], rec["summary"])
 
-    # Call Tone Service only when alert details are requested
-    tone_result = infer_tone(a.title, a.summary)
-    rec["tone"] = tone_result or {}
-
-    return rec
+    return JSONResponse(rec)
 
 
 # ─── Endpoint: GeoJSON for map ─────────────────────────────────────────────────
-@app.get("/map/geojson")
-def alerts_geojson(
-    days: int = Query(7, ge=1, le=365),
-    date: Optional[str] = Query(None, description="YYYY-MM-DD filter on published_at"),
-    db=Depends(get_db),
-):
+SEVERITY_BANDS = ["info", "low", "medium", "high"]
+SEVERITY_RANK = case(
+    {band: i for i, band in enumerate(SEVERITY_BANDS)},
+    value=Alert.severity_band,
+    else_=-1,
+)
+
+# Below this zoom level points are aggregated into grid cells
+CLUSTER_MAX_ZOOM = int(os.getenv("MAP_CLUSTER_MAX_ZOOM", "12"))
+# Grid cell edge in screen pixels (256px web-mercator tiles)
+CLUSTER_CELL_PX = int(os.getenv("MAP_CLUSTER_CELL_PX", "64"))
+
+
+def map_window(days: int, date: Optional[str]):
+    """
+    Return (column, start, end) of the map's time window: one published
+    day when `date` is given, else the last `days` days by fetched_at.
+    """
     if date:
         try:
             dt = datetime.fromisoformat(date)
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid date format")
-        next_day = dt + timedelta(days=1)
-        where_clause = (Alert.published_at >= dt, Alert.published_at < next_day)
-    else:
-        cutoff = datetime.utcnow() - timedelta(days=days)
-        where_clause = (Alert.fetched_at >= cutoff,)
+        return "published_at", dt, dt + timedelta(days=1)
+    return "fetched_at", datetime.utcnow() - timedelta(days=days), None
+
+
+def window_clause(days: int, date: Optional[str]) -> tuple:
+    column, start, end = map_window(days, date)
+    col = getattr(Alert, column)
+    return (col >= start,) if end is None else (col >= start, col < end)
+
+
+def parse_bbox(bbox: Optional[str]):
+    """Parse "minLon,minLat,maxLon,maxLat" into an ST_MakeEnvelope clause."""
+    if not bbox:
+        return None
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid bbox")
+    return func.ST_Intersects(
+        text("alerts.geom"),
+        func.ST_MakeEnvelope(min_lon, min_lat, max_lon, max_lat, 4326),
+    )
+
 
+def grid_cell_degrees(zoom: int) -> float:
+    return 360.0 / (256 * 2 ** zoom) * CLUSTER_CELL_PX
+
+
+@app.get("/map/geojson")
+async def alerts_geojson(
+    days: int = Query(7, ge=1, le=365),
+    date: Optional[str] = Query(None, description="YYYY-MM-DD filter on published_at"),
+    zoom: Optional[int] = Query(None, ge=0, le=22, description="map zoom; enables grid clustering"),
+    bbox: Optional[str] = Query(None, description="minLon,minLat,maxLon,maxLat"),
+    if_none_match: Optional[str] = Header(None),
+    db=Depends(get_database),
+):
+    where_clause = window_clause(days, date)
+    bbox_clause = parse_bbox(bbox)
+    if bbox_clause is not None:
+        where_clause += (bbox_clause,)
+
+    # Nothing ingested since (the cache's data version: the ingest sequence
+    # and newest fetched_at) and the window hasn't moved on a minute → 304
+    version = await response_cache.aversion(lambda: data_version(db))
+    _, start, _ = map_window(days, date)
+    etag = '"' + hashlib.sha1(
+        f"{days}|{date}|{zoom}|{bbox}|{version}|{start:%Y-%m-%dT%H:%M}".encode()
+    ).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+
+    if zoom is not None and zoom < CLUSTER_MAX_ZOOM:
+        body = await response_cache.aget_or_compute(
+            ("cluster_geojson", etag), version,
+            lambda: cluster_geojson(db, where_clause, zoom),
+        )
+        return JSONResponse(body, headers=headers)
+
+    # Postgres builds and encodes the whole FeatureCollection
+    feature = func.json_build_object(
+        "type", "Feature",
+        "geometry", cast(ST_AsGeoJSON(text("alerts.geom")), JSON),
+        "properties", func.json_build_object("id", Alert.id, "title", Alert.title),
+    )
     stmt = select(
-        Alert.id,
-        Alert.title,
-        ST_AsGeoJSON(text("alerts.geom")).label("geojson")
-    ).where(*where_clause)
+        cast(
+            func.json_build_object(
+                "type", "FeatureCollection",
+                "features", func.coalesce(func.json_agg(feature), text("'[]'::json")),
+            ),
+            Text,
+        )
+    ).where(text("alerts.geom IS NOT NULL"), *where_clause)
+
+    body = await response_cache.aget_or_compute(
+        ("alerts_geojson", etag), version, lambda: db.scalar(stmt)
+    )
+    return Response(body, media_type="application/json", headers=headers)
+
+
+async def cluster_geojson(db, where_clause: tuple, zoom: int) -> dict:
+    """
+    Aggregate points into ST_SnapToGrid cells sized for `zoom`; each
+    feature is the cell centroid with its alert count and max severity.
+    """
+    cell = func.ST_SnapToGrid(text("alerts.geom"), grid_cell_degrees(zoom))
+    stmt = (
+        select(
+            cell.label("cell"),
+            ST_AsGeoJSON(func.ST_Centroid(func.ST_Collect(text("alerts.geom")))).label("geojson"),
+            func.count().label("count"),
+            func.max(SEVERITY_RANK).label("max_rank"),
+        )
+        .where(text("alerts.geom IS NOT NULL"), *where_clause)
+        .group_by(text("cell"))
+    )
 
     features = []
-    for id_, title, gj in db.execute(stmt).all():
-        if not gj:
-            continue
-        geom = json.loads(gj)
+    for _, gj, count, max_rank in await db.all(stmt):
         features.append({
             "type": "Feature",
-            "geometry": geom,
-            "properties": {"id": id_, "title": title},
+            "geometry": json.loads(gj),
+            "properties": {
+                "cluster": True,
+                "count": count,
+                "max_severity": SEVERITY_BANDS[max_rank] if max_rank >= 0 else None,
+            },
         })
 
     return {"type": "FeatureCollection", "features": features}
 
 
+MVT_SQL = """
+WITH bounds AS (
+  SELECT ST_TileEnvelope(:z, :x, :y) AS env
+), mvtgeom AS (
+  SELECT ST_AsMVTGeom(ST_Transform(a.geom, 3857), bounds.env) AS geom,
+         a.new_id::text AS id, a.title, a.severity_band
+  FROM alerts a, bounds
+  WHERE a.geom && ST_Transform(bounds.env, 4326)
+    AND {window}
+)
+SELECT ST_AsMVT(mvtgeom, 'alerts') FROM mvtgeom
+"""
+
+
+@app.get("/map/tiles/{z}/{x}/{y}.mvt")
+async def alerts_tile(
+    z: int = Path(..., ge=0, le=22),
+    x: int = Path(..., ge=0),
+    y: int = Path(..., ge=0),
+    days: int = Query(7, ge=1, le=365),
+    date: Optional[str] = Query(None, description="YYYY-MM-DD filter on published_at"),
+    db=Depends(get_database),
+):
+    """Mapbox vector tile of the alerts in one web-mercator tile."""
+    if x >= 2 ** z or y >= 2 ** z:
+        raise HTTPException(status_code=404, detail="Tile out of range")
+
+    column, start, end = map_window(days, date)
+    window = f"a.{column} >= :start"
+    if end is not None:
+        window += f" AND a.{column} < :end"
+
+    tile = await db.scalar(
+        text(MVT_SQL.format(window=window)),
+        {"z": z, "x": x, "y": y, "start": start, "end": end},
+    )
+    return Response(bytes(tile or b""), media_type="application/vnd.mapbox-vector-tile")
+
+
+# ─── Stats: read from the daily rollups maintained by news_consumer ───────────
 @app.get("/stats/severity")
-def severity_stats(db=Depends(get_db)):
-    cutoff = datetime.utcnow() - timedelta(days=30)
-    stmt = select(Alert.severity_band, func.count()).where(Alert.fetched_at >= cutoff).group_by(Alert.severity_band)
-    rows = db.execute(stmt).all()
-    return [{"severity_band": band, "count": cnt} for band, cnt in rows]
+@response_cache.cached(data_version)
+async def severity_stats(db=Depends(get_database)):
+    cutoff = (datetime.utcnow() - timedelta(days=30)).date()
+    stmt = text("""
+      SELECT severity_band, sum(alert_count) AS cnt
+      FROM alerts_daily_severity
+      WHERE day >= :cutoff
+      GROUP BY severity_band
+    """)
+    rows = await db.all(stmt, {"cutoff": cutoff})
+    return [{"severity_band": band or None, "count": int(cnt)} for band, cnt in rows]
 
 @app.get("/stats/counts")
-def daily_counts(days: int = Query(30, ge=1, le=365), db=Depends(get_db)):
-    cutoff = datetime.utcnow() - timedelta(days=days)
-    stmt = (
-        select(
-            func.to_char(Alert.published_at, 'YYYY-MM-DD').label("date"),
-            func.count().label("count")
-        )
-        .where(Alert.published_at >= cutoff)
-        .group_by(text("date"))
-        .order_by(text("date"))
-    )
-    return [{"date": d, "count": c} for d, c in db.execute(stmt).all()]
+@response_cache.cached(data_version)
+async def daily_counts(days: int = Query(30, ge=1, le=365), db=Depends(get_database)):
+    cutoff = (datetime.utcnow() - timedelta(days=days)).date()
+    stmt = text("""
+      SELECT day, alert_count
+      FROM alerts_daily
+      WHERE day >= :cutoff
+      ORDER BY day
+    """)
+    return [{"date": d.isoformat(), "count": c} for d, c in await db.all(stmt, {"cutoff": cutoff})]
 
 @app.get("/stats/avg_violence")
-def avg_violence(days: int = Query(30, ge=1, le=365), db=Depends(get_db)):
-    cutoff = datetime.utcnow() - timedelta(days=days)
-    stmt = (
-        select(
-            func.to_char(Alert.published_at, 'YYYY-MM-DD').label("date"),
-            func.avg(Alert.violence_score).label("avg_score")
-        )
-        .where(Alert.published_at >= cutoff)
-        .group_by(text("date"))
-        .order_by(text("date"))
-    )
-    return [{"date": d, "avg_score": float(c)} for d, c in db.execute(stmt).all()]
+@response_cache.cached(data_version)
+async def avg_violence(days: int = Query(30, ge=1, le=365), db=Depends(get_database)):
+    cutoff = (datetime.utcnow() - timedelta(days=days)).date()
+    stmt = text("""
+      SELECT day, score_sum / score_count AS avg_score
+      FROM alerts_daily
+      WHERE day >= :cutoff AND score_count > 0
+      ORDER BY day
+    """)
+    return [{"date": d.isoformat(), "avg_score": float(c)} for d, c in await db.all(stmt, {"cutoff": cutoff})]
 
 @app.get("/stats/activities")
-def activities_by_day(days: int = Query(14, ge=1, le=365), db=Depends(get_db)):
-    cutoff = datetime.utcnow() - timedelta(days=days)
+@response_cache.cached(data_version)
+async def activities_by_day(days: int = Query(14, ge=1, le=365), db=Depends(get_database)):
+    cutoff = (datetime.utcnow() - timedelta(days=days)).date()
     stmt = text("""
-      SELECT to_char(published_at,'YYYY-MM-DD') AS date,
-             activity,
-             count(*) AS cnt
-      FROM alerts, jsonb_array_elements_text(to_jsonb(activities)) AS activity
-      WHERE published_at >= :cutoff
-      GROUP BY date, activity
-      ORDER BY date
+      SELECT day, activity, alert_count
+      FROM alerts_daily_activity
+      WHERE day >= :cutoff
+      ORDER BY day
     """)
-    rows = db.execute(stmt, {"cutoff": cutoff}).all()
+    rows = await db.all(stmt, {"cutoff": cutoff})
     by_date = {}
-    for date, act, cnt in rows:
-        by_date.setdefault(date, {})[act] = cnt
+    for day, act, cnt in rows:
+        by_date.setdefault(day.isoformat(), {})[act] = cnt
     return [
       {"date": date, **by_date[date]}
       for date in sorted(by_date)
     ]
 
 @app.get("/stats/top_entities")
-def top_entities(limit: int = Query(10, ge=1, le=100), db=Depends(get_db)):
-    # unnest entities JSON array, group by text
+@response_cache.cached(data_version)
+async def top_entities(limit: int = Query(10, ge=1, le=100), db=Depends(get_database)):
+    # all-time totals, kept up to date alongside the daily rollups
     stmt = text("""
-      SELECT elem->>'text' AS entity, count(*) AS cnt
-      FROM alerts, jsonb_array_elements(entities) AS elem
-      GROUP BY entity
-      ORDER BY cnt DESC
+      SELECT entity, alert_count AS cnt
+      FROM alerts_entity_totals
+      ORDER BY alert_count DESC
       LIMIT :limit
     """)
-    return [{"entity": e, "count": c} for e, c in db.execute(stmt, {"limit": limit})]
+    return [{"entity": e, "count": int(c)} for e, c in await db.all(stmt, {"limit": limit})]
 
 @app.on_event("startup")
 def on_startup():
     Base.metadata.create_all(bind=engine)
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    if _tone_client is not None:
+        await _tone_client.aclose()
+    if async_engine is not None:
+        await async_engine.dispose()
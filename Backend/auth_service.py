@@ -2,15 +2,21 @@
 """
 FastAPI service providing login and signup endpoints backed by Neon/Postgres.
 """
+import asyncio
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 from fastapi import FastAPI, HTTPException, Depends, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, EmailStr
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from cachetools import TTLCache
 from sqlalchemy import Column, String, DateTime, create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
@@ -21,6 +27,9 @@ load_dotenv()
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "60"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", "4"))
 
 DATABASE_URL = os.getenv("PG_DSN")  
 
@@ -41,6 +50,10 @@ Base.metadata.create_all(bind=engine)
 # --- Security Utilities ---
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/token", auto_error=False)
+
+# bcrypt is CPU-bound; run it on a bounded pool, off the event loop
+bcrypt_pool = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
@@ -48,12 +61,22 @@ def get_password_hash(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+async def hash_password_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(bcrypt_pool, get_password_hash, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        bcrypt_pool, verify_password, plain_password, hashed_password
+    )
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(
         minutes=ACCESS_TOKEN_EXPIRE_MINUTES
     ))
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": int(time.time())})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 # --- Pydantic Schemas ---
@@ -80,6 +103,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- Verified-token cache & revocation ---
+# token -> User, so repeat requests skip the DB lookup for TOKEN_CACHE_TTL
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+token_cache_lock = threading.Lock()
+# token -> exp timestamp for logged-out tokens; email -> revocation time
+revoked_tokens = {}
+revoked_users = {}
+
+def revoke_token(token: str, exp: float):
+    """Reject `token` until it would have expired anyway."""
+    now = time.time()
+    with token_cache_lock:
+        token_cache.pop(token, None)
+        for t in [t for t, e in revoked_tokens.items() if e < now]:
+            del revoked_tokens[t]
+        revoked_tokens[token] = exp
+
+def revoke_user(email: str):
+    """
+    Reject every token issued to `email` before the current second.
+
+    No route calls this yet: it's the hook for a password change, password
+    reset or account disable, and should be called right after that change
+    is committed. Revocations are per process, like the token cache.
+    """
+    with token_cache_lock:
+        revoked_users[email] = time.time()
+        for t in [t for t, u in token_cache.items() if u.email == email]:
+            del token_cache[t]
+
+def is_revoked(token: str, email: str, issued_at) -> bool:
+    if token in revoked_tokens:
+        return True
+    revoked_at = revoked_users.get(email)
+    # iat has whole-second precision: a token issued in the same second as
+    # the revocation may be the replacement, so only earlier seconds count
+    return revoked_at is not None and (issued_at or 0) < int(revoked_at)
+
+def load_user(email: str):
+    with SessionLocal() as db:
+        return db.query(User).filter(User.email == email).first()
+
 # Dependency
 def get_db():
     db = SessionLocal()
@@ -103,33 +168,46 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         token_data = TokenData(email=email)
     except JWTError:
         raise credentials_exception
-    from sqlalchemy.orm import Session
-    with SessionLocal() as db:
-        user = db.query(User).filter(User.email == token_data.email).first()
+    if is_revoked(token, token_data.email, payload.get("iat")):
+        raise credentials_exception
+
+    with token_cache_lock:
+        user = token_cache.get(token)
+    if user is None:
+        user = await run_in_threadpool(load_user, token_data.email)
         if user is None:
             raise credentials_exception
+        with token_cache_lock:
+            token_cache[token] = user
     return user
 
 # --- Routes ---
 @app.post("/signup", status_code=201)
-def signup(user: UserCreate, db=Depends(get_db)):
-    existing = db.query(User).filter(User.email == user.email).first()
+async def signup(user: UserCreate, db=Depends(get_db)):
+    existing = await run_in_threadpool(
+        lambda: db.query(User).filter(User.email == user.email).first()
+    )
     if existing:
         raise HTTPException(
             status_code=400, detail="Email already registered"
         )
-    hashed_pw = get_password_hash(user.password)
+    hashed_pw = await hash_password_async(user.password)
     db_user = User(email=user.email, hashed_password=hashed_pw)
-    db.add(db_user)
-    db.commit()
+
+    def save():
+        db.add(db_user)
+        db.commit()
+    await run_in_threadpool(save)
     return {"msg": "User created successfully"}
 
 @app.post("/token", response_model=Token)
-def login_for_access_token(
+async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(), db=Depends(get_db)
 ):
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(
+    user = await run_in_threadpool(
+        lambda: db.query(User).filter(User.email == form_data.username).first()
+    )
+    if not user or not await verify_password_async(
         form_data.password, user.hashed_password
     ):
         raise HTTPException(
@@ -143,11 +221,18 @@ def login_for_access_token(
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/logout")
-def logout():
+def logout(token: str | None = Depends(optional_oauth2_scheme)):
     """
     For JWT, logout is handled client-side by deleting the token.
-    This endpoint exists for frontend convenience.
+    If the token is sent along it is also revoked server-side until it
+    expires, so cached validations of it stop working immediately.
     """
+    if token:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            revoke_token(token, payload.get("exp", time.time()))
+        except JWTError:
+            pass
     return {"msg": "Logged out. Please remove the token on the client."}
 
 @app.get("/users/me")
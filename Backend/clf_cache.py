@@ -0,0 +1,123 @@
+# clf_cache.py
+"""
+Content-addressed cache for zero-shot classification results.
+
+Syndicated stories show up in several feeds under different ids, so results
+are keyed on a hash of the normalized text together with the model name and
+label set. An in-process LRU sits in front of an optional diskcache store.
+"""
+import hashlib
+import re
+import time
+
+from cachetools import LRUCache
+
+
+def normalize_text(text: str) -> str:
+    """
+    Case-fold and collapse whitespace so trivial variants share a key.
+    """
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+def cache_key(text: str, model_name: str, labels, multi_label: bool) -> str:
+    h = hashlib.sha1()
+    for part in (model_name, "\x1f".join(labels), str(multi_label),
+                 normalize_text(text)):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x1e")
+    return h.hexdigest()
+
+
+class ClassificationCache:
+    """
+    Two-tier (LRU + optional disk) store of classification results.
+    """
+
+    def __init__(self, maxsize: int, disk_dir: str = None):
+        self.lru = LRUCache(maxsize=max(1, maxsize))
+        self.disk = None
+        if disk_dir:
+            import diskcache
+            self.disk = diskcache.Cache(disk_dir)
+
+    def get(self, key: str):
+        result = self.lru.get(key)
+        if result is None and self.disk is not None:
+            result = self.disk.get(key)
+            if result is not None:
+                self.lru[key] = result
+        return result
+
+    def set(self, key: str, result: dict) -> None:
+        self.lru[key] = result
+        if self.disk is not None:
+            self.disk.set(key, result)
+
+
+class CachedClassifier:
+    """
+    Wrap a zero-shot classifier so repeated texts skip inference.
+
+    Call signature and return shape match the wrapped classifier. Hits,
+    misses and inference time accumulate until `reset_stats()`.
+    """
+
+    def __init__(self, clf, cache: ClassificationCache):
+        self.clf = clf
+        self.cache = cache
+        self.model_name = getattr(clf, "model_name", type(clf).__name__)
+        if getattr(clf, "backend", None):
+            # quantized/ONNX scores drift slightly; keep them apart
+            self.model_name += f":{clf.backend}"
+        self.hits = 0
+        self.misses = 0
+        self.infer_seconds = 0.0
+        self._total_seconds = 0.0
+        self._total_items = 0
+
+    def __call__(self, sequences, candidate_labels, multi_label: bool = False,
+                 **kwargs):
+        single = isinstance(sequences, str)
+        if single:
+            sequences = [sequences]
+
+        keys = [cache_key(seq, self.model_name, candidate_labels, multi_label)
+                for seq in sequences]
+        results = [self.cache.get(k) for k in keys]
+        missing = [i for i, r in enumerate(results) if r is None]
+        self.hits += len(sequences) - len(missing)
+
+        if missing:
+            start = time.perf_counter()
+            fresh = self.clf([sequences[i] for i in missing], candidate_labels,
+                             multi_label=multi_label, **kwargs)
+            elapsed = time.perf_counter() - start
+            self.infer_seconds += elapsed
+            self.misses += len(missing)
+            self._total_seconds += elapsed
+            self._total_items += len(missing)
+            for i, res in zip(missing, fresh):
+                stored = {"labels": res["labels"], "scores": res["scores"]}
+                self.cache.set(keys[i], stored)
+                results[i] = stored
+
+        results = [{"sequence": seq, **res}
+                   for seq, res in zip(sequences, results)]
+        return results[0] if single else results
+
+    def reset_stats(self) -> dict:
+        """
+        Return and clear the counters, with an estimate of inference time
+        saved by hits (at the average per-item cost of all misses so far).
+        """
+        per_item = (self._total_seconds / self._total_items
+                    if self._total_items else 0.0)
+        stats = {
+            "hits":          self.hits,
+            "misses":        self.misses,
+            "saved_seconds": self.hits * per_item,
+        }
+        self.hits = self.misses = 0
+        self.infer_seconds = 0.0
+        return stats
@@ -0,0 +1,34 @@
+# codec.py
+"""
+Wire encoding of alert records between news_producer and news_consumer.
+
+The producer tags every message with a "content-encoding" header; the
+consumer picks the decoder from that header and treats untagged messages
+as JSON, so old and new producers can share a topic.
+"""
+import json
+
+ENCODING_HEADER = "content-encoding"
+ENCODINGS = ("json", "msgpack")
+
+
+def encode(record: dict, encoding: str = "json") -> bytes:
+    if encoding == "json":
+        return json.dumps(record, separators=(",", ":")).encode("utf-8")
+    if encoding == "msgpack":
+        import msgpack
+        return msgpack.packb(record, use_bin_type=True)
+    raise ValueError(f"Unknown message encoding: {encoding!r}")
+
+
+def decode(value: bytes, headers=None) -> dict:
+    encoding = "json"
+    for key, val in headers or []:
+        if key == ENCODING_HEADER and val:
+            encoding = val.decode("utf-8")
+    if encoding == "json":
+        return json.loads(value)
+    if encoding == "msgpack":
+        import msgpack
+        return msgpack.unpackb(value, raw=False)
+    raise ValueError(f"Unknown message encoding: {encoding!r}")
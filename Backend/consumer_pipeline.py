@@ -0,0 +1,179 @@
+# consumer_pipeline.py
+"""
+Building blocks for the staged consumer: worker stages connected by
+bounded queues, and an offset tracker that only lets contiguous, fully
+written Kafka offsets be committed.
+"""
+import queue
+import threading
+import time
+
+
+class Stage:
+    """
+    `workers` threads taking items from `inq`, applying `fn` and putting
+    the result on `outq`. If `fn` raises, each item is retried on its own;
+    if that fails too it goes through `fallback` (a degraded result that
+    still moves on to `outq`) or, without one, to `on_error`.
+    """
+
+    def __init__(self, name, fn, inq, outq, workers=1, on_error=None,
+                 fallback=None):
+        self.name = name
+        self.fn = fn
+        self.inq = inq
+        self.outq = outq
+        self.workers = workers
+        self.on_error = on_error
+        self.fallback = fallback
+        self.processed = 0
+        self._count_lock = threading.Lock()
+        self._threads = []
+
+    def start(self, stop):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._loop, args=(stop,),
+                                      name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def join(self, timeout=None):
+        """Wait for the workers to exit once `stop` is set."""
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def alive(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    def _next_items(self, stop):
+        try:
+            return [self.inq.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+
+    def _handle(self, items):
+        return [self.fn(item) for item in items]
+
+    def _loop(self, stop):
+        while not stop.is_set():
+            items = self._next_items(stop)
+            if not items:
+                continue
+            try:
+                results = self._handle(items)
+            except Exception as e:
+                print(f"⚠️  {self.name} failed on {len(items)} item(s): {e!r}")
+                results = []
+                for item in items:
+                    results.extend(self._recover(item))
+            with self._count_lock:
+                self.processed += len(items)
+            if self.outq is not None:
+                for result in results:
+                    self.outq.put(result)
+
+    def _recover(self, item):
+        """Retry one failed item alone, then fall back; returns its results."""
+        try:
+            return self._handle([item])
+        except Exception as e:
+            print(f"⚠️  {self.name} retry failed: {e!r}")
+        if self.fallback is not None:
+            return [self.fallback(item)]
+        if self.on_error is not None:
+            self.on_error(item)
+        return []
+
+    def report(self) -> dict:
+        return {"queue": self.inq.qsize(), "processed": self.processed}
+
+
+class BatchStage(Stage):
+    """
+    Stage whose `fn` takes a list: it waits for the first item, then keeps
+    collecting until `batch_size` items or `max_wait` seconds have passed.
+    """
+
+    def __init__(self, name, fn, inq, outq, batch_size, max_wait,
+                 workers=1, on_error=None, fallback=None):
+        super().__init__(name, fn, inq, outq, workers, on_error, fallback)
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+
+    def _next_items(self, stop):
+        items = super()._next_items(stop)
+        if not items:
+            return items
+        deadline = time.monotonic() + self.max_wait
+        while len(items) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                items.append(self.inq.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return items
+
+    def _handle(self, items):
+        return self.fn(items)
+
+
+class OffsetTracker:
+    """
+    Track in-flight offsets per (topic, partition). `committable()` returns
+    the next offset to commit for each partition whose low end is done.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}   # (topic, partition) -> set of offsets in flight
+        self._done = {}      # (topic, partition) -> set of finished offsets
+        self._next = {}      # (topic, partition) -> lowest offset not committed
+
+    def add(self, topic, partition, offset):
+        tp = (topic, partition)
+        with self._lock:
+            self._pending.setdefault(tp, set()).add(offset)
+            self._next.setdefault(tp, offset)
+
+    def done(self, topic, partition, offset):
+        tp = (topic, partition)
+        with self._lock:
+            if offset in self._pending.get(tp, ()):
+                self._pending[tp].discard(offset)
+                self._done.setdefault(tp, set()).add(offset)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return sum(len(p) for p in self._pending.values())
+
+    def committable(self) -> dict:
+        """
+        {(topic, partition): offset} to commit, advancing past every
+        finished offset below the lowest one still in flight.
+        """
+        out = {}
+        with self._lock:
+            for tp, done in self._done.items():
+                if not done:
+                    continue
+                pending = self._pending.get(tp)
+                limit = min(pending) if pending else None
+                ready = [o for o in done if limit is None or o < limit]
+                if not ready:
+                    continue
+                done.difference_update(ready)
+                nxt = max(ready) + 1
+                if nxt > self._next.get(tp, 0):
+                    self._next[tp] = nxt
+                    out[tp] = nxt
+        return out
+
+    def forget(self, partitions):
+        """Drop state for partitions revoked in a rebalance."""
+        with self._lock:
+            for tp in partitions:
+                self._pending.pop(tp, None)
+                self._done.pop(tp, None)
+                self._next.pop(tp, None)
@@ -0,0 +1,149 @@
+# dedup_store.py
+"""
+Stores for "have we already published this story id?" checks.
+
+The SQLite store survives restarts and evicts ids older than a TTL, so
+memory and disk stay flat over long uptimes. An optional Bloom filter
+answers most "never seen" lookups without touching the database.
+"""
+import hashlib
+import math
+import sqlite3
+import threading
+import time
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings (no false negatives).
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(1, capacity)
+        self.num_bits = max(8, int(-capacity * math.log(error_rate)
+                                   / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str) -> None:
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7))
+                   for pos in self._positions(key))
+
+
+class MemoryDedupStore:
+    """
+    In-process store with TTL eviction; state is lost on restart.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl = ttl_seconds
+        self._seen = {}
+
+    def __contains__(self, uid: str) -> bool:
+        return uid in self._seen
+
+    def add(self, uid: str) -> None:
+        self._seen[uid] = time.time()
+
+    def evict_expired(self) -> int:
+        cutoff = time.time() - self.ttl
+        stale = [uid for uid, ts in self._seen.items() if ts < cutoff]
+        for uid in stale:
+            del self._seen[uid]
+        return len(stale)
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteDedupStore:
+    """
+    On-disk store keyed by story id, optionally fronted by a Bloom filter.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float,
+                 bloom_capacity: int = 0):
+        self.ttl = ttl_seconds
+        self.bloom_capacity = bloom_capacity
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen ("
+            " uid TEXT PRIMARY KEY,"
+            " seen_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS seen_at_idx ON seen (seen_at)"
+        )
+        self._conn.commit()
+        self.bloom = None
+        self._rebuild_bloom()
+
+    def _rebuild_bloom(self) -> None:
+        if not self.bloom_capacity:
+            return
+        bloom = BloomFilter(self.bloom_capacity)
+        for (uid,) in self._conn.execute("SELECT uid FROM seen"):
+            bloom.add(uid)
+        self.bloom = bloom
+
+    def __contains__(self, uid: str) -> bool:
+        if self.bloom is not None and uid not in self.bloom:
+            return False
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM seen WHERE uid = ? AND seen_at >= ?",
+                (uid, time.time() - self.ttl),
+            ).fetchone()
+        return row is not None
+
+    def add(self, uid: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO seen (uid, seen_at) VALUES (?, ?)",
+                (uid, time.time()),
+            )
+            self._conn.commit()
+        if self.bloom is not None:
+            self.bloom.add(uid)
+
+    def evict_expired(self) -> int:
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM seen WHERE seen_at < ?",
+                (time.time() - self.ttl,),
+            )
+            self._conn.commit()
+            evicted = cur.rowcount
+            if evicted:
+                # Bloom filters can't forget; start over from what's left
+                self._rebuild_bloom()
+        return evicted
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def make_dedup_store(cfg: dict):
+    """
+    Build the dedup store selected by cfg["dedup_backend"] (sqlite|memory).
+    """
+    ttl = cfg["dedup_ttl_days"] * 86400
+    if cfg["dedup_backend"] == "memory":
+        return MemoryDedupStore(ttl)
+    if cfg["dedup_backend"] == "sqlite":
+        return SQLiteDedupStore(cfg["dedup_path"], ttl,
+                                bloom_capacity=cfg["dedup_bloom_capacity"])
+    raise ValueError(f"Unknown DEDUP_BACKEND: {cfg['dedup_backend']!r}")
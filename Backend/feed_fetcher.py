@@ -0,0 +1,121 @@
+# feed_fetcher.py
+"""
+Concurrent RSS fetching with per-feed timeouts and conditional GET.
+
+ETag / Last-Modified validators are kept per URL (and persisted to a small
+JSON file between restarts) so unchanged feeds come back as a 304 and are
+never handed to feedparser.
+"""
+import gzip
+import json
+import urllib.error
+import urllib.request
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import feedparser
+
+USER_AGENT = "nlp4safety_news_producer/1.0"
+
+
+def load_feed_state(path: str) -> dict:
+    """
+    Read {url: {"etag": ..., "modified": ...}} from `path`, or {} if absent.
+    """
+    try:
+        return json.loads(Path(path).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def save_feed_state(path: str, state: dict) -> None:
+    """
+    Atomically write the validator state to `path`.
+    """
+    tmp = Path(f"{path}.tmp")
+    tmp.write_text(json.dumps(state))
+    tmp.replace(path)
+
+
+def _decode_body(body: bytes, encoding: str) -> bytes:
+    """Undo a gzip/deflate Content-Encoding."""
+    encoding = (encoding or "").strip().lower()
+    if encoding in ("gzip", "x-gzip"):
+        return gzip.decompress(body)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            # some servers send raw deflate without the zlib header
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    return body
+
+
+def fetch_feed(url: str, validators: dict, timeout: float) -> tuple:
+    """
+    Fetch one feed with a conditional GET.
+
+    Returns (feed, validators): `feed` is the parsed feed, or None when the
+    server answered 304 Not Modified; `validators` are the ones to send on
+    the next request.
+    """
+    headers = {"User-Agent": USER_AGENT,
+               "Accept-Encoding": "gzip, deflate"}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("modified"):
+        headers["If-Modified-Since"] = validators["modified"]
+
+    req = urllib.request.Request(url, headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            body = _decode_body(resp.read(),
+                                resp.headers.get("Content-Encoding"))
+            # feedparser reads the charset from Content-Type
+            response_headers = {k.lower(): v for k, v in resp.headers.items()
+                                if k.lower() not in ("content-encoding",
+                                                     "content-length")}
+            new_validators = {
+                "etag":     resp.headers.get("ETag"),
+                "modified": resp.headers.get("Last-Modified"),
+            }
+    except urllib.error.HTTPError as err:
+        if err.code == 304:
+            return None, validators
+        raise
+
+    return (feedparser.parse(body, response_headers=response_headers),
+            new_validators)
+
+
+def fetch_all(urls: list, state: dict, timeout: float,
+              max_workers: int) -> tuple:
+    """
+    Fetch `urls` concurrently (at most `max_workers` at a time) using the
+    validators in `state`, and return (changed, validators): (url, feed)
+    pairs for feeds that changed, and {url: validators} to merge into
+    `state` once those feeds' entries have been handled. Failures and
+    timeouts are logged and leave the feed out of both.
+    """
+    changed = []
+    validators_by_url = {}
+    if not urls:
+        return changed, validators_by_url
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {
+            url: pool.submit(fetch_feed, url, state.get(url, {}), timeout)
+            for url in urls
+        }
+        for url, fut in futures.items():
+            try:
+                feed, validators = fut.result()
+            except Exception as exc:
+                print(f"⚠️ {url}: fetch error → {exc}")
+                continue
+            validators_by_url[url] = validators
+            if feed is not None:
+                changed.append((url, feed))
+
+    return changed, validators_by_url
@@ -4,11 +4,15 @@ from geopy.extra.rate_limiter import RateLimiter
 from spacy.pipeline import EntityRuler
 from pathlib import Path
 import json
+import os
+import re
+import threading
 import time
 
-# Build your spaCy pipeline (assuming you’ve fixed nlp_factory)
-from nlp_factory import build_pipeline
-NLP = build_pipeline()
+from cachetools import LRUCache
+
+# spaCy pipeline is built lazily on first use (tier from NER_MODEL_TIER)
+from nlp_factory import get_pipeline
 
 # 1. Configure Nominatim with a clear user_agent and your email
 geolocator = Nominatim(
@@ -24,25 +28,276 @@ geocode = RateLimiter(
     error_wait_seconds=5.0
 )
 
-def geocode_text(text):
+# 3. Cache outcomes per place name; misses and failures expire sooner
+MISS = "miss"
+FAILED = "failed"
+
+
+def normalize_place(name):
+    """Case-fold and collapse whitespace so "Gaza " and "gaza" share a key."""
+    return re.sub(r"\s+", " ", name).strip().casefold()
+
+
+class GeoCache:
     """
-    Extract GPE/LOC entities via spaCy NER, then geocode the first hit.
-    Returns (lon, lat, ents_list).
+    In-process LRU in front of an optional diskcache store. Values are
+    (lon, lat) tuples, MISS (no result) or FAILED (geocoder error).
+    Safe to share between geocode worker threads.
     """
-    doc = NLP(text)
-    ents = [{"text": ent.text, "label": ent.label_} for ent in doc.ents]
 
-    for ent in doc.ents:
-        if ent.label_ in ("GPE", "LOC"):
+    def __init__(self, maxsize, disk_dir=None, hit_ttl=30 * 86400,
+                 miss_ttl=6 * 3600, fail_ttl=600):
+        self.lru = LRUCache(maxsize=max(1, maxsize))
+        self._lock = threading.Lock()   # LRUCache isn't thread-safe
+        self.disk = None
+        if disk_dir:
+            import diskcache
+            self.disk = diskcache.Cache(disk_dir)
+        self.ttls = {MISS: miss_ttl, FAILED: fail_ttl}
+        self.hit_ttl = hit_ttl
+
+    def get(self, name):
+        key = normalize_place(name)
+        with self._lock:
+            entry = self.lru.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.time():
+                    return value
+                self.lru.pop(key, None)
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                # the disk tier enforces its own expiry; promote to memory
+                ttl = self.ttls.get(value, self.hit_ttl)
+                with self._lock:
+                    self.lru[key] = (value, time.time() + ttl)
+                return value
+        return None
+
+    def set(self, name, value, ttl=None):
+        key = normalize_place(name)
+        if ttl is None:
+            ttl = self.ttls.get(value, self.hit_ttl)
+        with self._lock:
+            self.lru[key] = (value, time.time() + ttl if ttl else None)
+        if self.disk is not None:
+            self.disk.set(key, value, expire=ttl or None)
+
+    def load_gazetteer(self, path):
+        """
+        Warm the cache from a tab-separated file of `name  lat  lon` lines.
+        Gazetteer entries never expire. Returns the number loaded.
+        """
+        count = 0
+        for line in Path(path).read_text(encoding="utf-8").splitlines():
+            parts = line.split("\t")
+            if len(parts) < 3 or line.startswith("#"):
+                continue
             try:
-                loc = geocode(ent.text, addressdetails=False, language="en")
-            except Exception as e:
-                # log and skip on 403 or other errors
-                print(f"⚠️ Geocoding failed for “{ent.text}”: {e}")
-                return None, None, ents
+                lat, lon = float(parts[1]), float(parts[2])
+            except ValueError:
+                continue
+            self.set(parts[0], (lon, lat), ttl=0)
+            count += 1
+        return count
+
+
+class NominatimGeocoder:
+    """Remote backend: the rate-limited Nominatim `geocode` above."""
+
+    def lookup(self, name):
+        try:
+            loc = geocode(name, addressdetails=False, language="en")
+        except Exception as e:
+            # log and skip on 403 or other errors
+            print(f"⚠️ Geocoding failed for “{name}”: {e}")
+            return FAILED
+        return (loc.longitude, loc.latitude) if loc else MISS
+
+
+class GazetteerGeocoder:
+    """
+    Offline backend over a GeoNames-style TSV (geonameid, name, asciiname,
+    alternatenames, latitude, longitude, ..., population in column 15).
+    Names are matched exactly, then case-folded against names and aliases;
+    ambiguous names resolve to the most populous place.
+    """
+
+    def __init__(self, path):
+        self.exact = {}
+        self.folded = {}
+        self.load(path)
+
+    @staticmethod
+    def _keep(index, key, pop, coords):
+        best = index.get(key)
+        if best is None or pop > best[0]:
+            index[key] = (pop, coords)
+
+    def load(self, path):
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                cols = line.rstrip("\n").split("\t")
+                if len(cols) < 6 or line.startswith("#"):
+                    continue
+                try:
+                    coords = (float(cols[5]), float(cols[4]))
+                except ValueError:
+                    continue
+                try:
+                    pop = int(cols[14]) if len(cols) > 14 and cols[14] else 0
+                except ValueError:
+                    pop = 0
+
+                names = {cols[1], cols[2]}
+                names.update(a for a in cols[3].split(",") if a)
+                self._keep(self.exact, cols[1], pop, coords)
+                for n in names:
+                    self._keep(self.folded, normalize_place(n), pop, coords)
+        print(f"✅  Gazetteer loaded: {len(self.folded)} names from {path}")
+
+    def lookup(self, name):
+        hit = self.exact.get(name.strip()) or self.folded.get(normalize_place(name))
+        return hit[1] if hit else MISS
+
+
+class CachedGeocoder:
+    """Put a GeoCache in front of a slow backend."""
+
+    def __init__(self, backend, cache):
+        self.backend = backend
+        self.cache = cache
+
+    def lookup(self, name):
+        cached = self.cache.get(name)
+        if cached is not None:
+            return cached
+        result = self.backend.lookup(name)
+        self.cache.set(name, result)
+        return result
+
+
+class ChainGeocoder:
+    """Try backends in order; the first answer other than MISS wins."""
+
+    def __init__(self, backends):
+        self.backends = backends
+
+    def lookup(self, name):
+        for backend in self.backends:
+            result = backend.lookup(name)
+            if result != MISS:
+                return result
+        return MISS
+
 
-            if loc:
-                return loc.longitude, loc.latitude, ents
+_cache = None
+_geocoder = None
+# geocode workers may race to build these; reentrant as one calls the other
+_build_lock = threading.RLock()
+
+
+def get_geo_cache():
+    """Build the shared GeoCache from the environment on first use."""
+    global _cache
+    with _build_lock:
+        if _cache is None:
+            cache = GeoCache(
+                maxsize=int(os.getenv("GEOCODE_CACHE_SIZE", "50000")),
+                disk_dir=os.getenv("GEOCODE_CACHE_DIR", "geocode_cache") or None,
+                hit_ttl=float(os.getenv("GEOCODE_TTL_DAYS", "30")) * 86400,
+                miss_ttl=float(os.getenv("GEOCODE_MISS_TTL_HOURS", "6")) * 3600,
+                fail_ttl=float(os.getenv("GEOCODE_FAIL_TTL_SECONDS", "600")),
+            )
+            gazetteer = os.getenv("GEOCODE_GAZETTEER")
+            if gazetteer:
+                n = cache.load_gazetteer(gazetteer)
+                print(f"✅  Loaded {n} gazetteer entries into geocode cache.")
+            _cache = cache
+    return _cache
+
+
+def get_geocoder():
+    """
+    Build the geocoder chain named by GEOCODER_BACKENDS on first use,
+    e.g. "gazetteer,nominatim" (offline first, remote on a miss).
+    """
+    global _geocoder
+    if _geocoder is not None:
+        return _geocoder
+    with _build_lock:
+        if _geocoder is None:
+            backends = []
+            names = os.getenv("GEOCODER_BACKENDS", "nominatim")
+            for name in (n.strip() for n in names.split(",") if n.strip()):
+                if name == "gazetteer":
+                    path = os.getenv("GEONAMES_PATH")
+                    if not path:
+                        raise RuntimeError("GEONAMES_PATH must be set for the gazetteer backend")
+                    backends.append(GazetteerGeocoder(path))
+                elif name == "nominatim":
+                    backends.append(CachedGeocoder(NominatimGeocoder(),
+                                                   get_geo_cache()))
+                else:
+                    raise ValueError(f"Unknown geocoder backend: {name!r}")
+            _geocoder = ChainGeocoder(backends)
+    return _geocoder
+
+
+def geocode_place(name):
+    """
+    Resolve one place name to (lon, lat), MISS or FAILED using the
+    configured geocoder chain.
+    """
+    return get_geocoder().lookup(name)
+
+
+# Only these components matter for entity extraction; the rest are skipped
+NER_COMPONENTS = {"transformer", "tok2vec", "ner", "entity_ruler"}
+
+
+def locate(ents):
+    """
+    Geocode the first GPE/LOC entity in `ents` that resolves.
+    Returns (lon, lat), or (None, None).
+    """
+    for ent in ents:
+        if ent["label"] in ("GPE", "LOC"):
+            result = geocode_place(ent["text"])
+            if result == FAILED:
+                return None, None
+            if result != MISS:
+                return result[0], result[1]
 
             # if no location found, try next entity
-    return None, None, ents
+    return None, None
+
+
+def extract_entities(texts, batch_size=32, n_process=1):
+    """
+    Run all texts through nlp.pipe (with components not needed for NER
+    disabled) and return one ents_list of {"text", "label"} per text.
+    """
+    nlp = get_pipeline()
+    disable = [name for name in nlp.pipe_names if name not in NER_COMPONENTS]
+    docs = nlp.pipe(texts, batch_size=batch_size, n_process=n_process,
+                    disable=disable)
+    return [[{"text": ent.text, "label": ent.label_} for ent in doc.ents]
+            for doc in docs]
+
+
+def geocode_text(text):
+    """
+    Extract GPE/LOC entities via spaCy NER, then geocode the first hit.
+    Returns (lon, lat, ents_list).
+    """
+    return geocode_texts([text])[0]
+
+
+def geocode_texts(texts, batch_size=32, n_process=1):
+    """
+    Batched geocode_text: one (lon, lat, ents_list) per text.
+    """
+    return [(*locate(ents), ents)
+            for ents in extract_entities(texts, batch_size, n_process)]
@@ -0,0 +1,148 @@
+"""
+Client-side load test: many concurrent clients hitting one set of
+endpoints (--paths), reporting throughput and latency percentiles.
+
+Compare the sync and async database paths by running the service once per
+mode (with the response cache off so every request reaches Postgres) and
+pointing this script at it:
+
+    RESPONSE_CACHE_TTL=0 DB_ASYNC=0 uvicorn alerts_service:app --port 8001
+    python load_test.py --url http://localhost:8001 --clients 200 --seconds 60
+
+    RESPONSE_CACHE_TTL=0 DB_ASYNC=1 uvicorn alerts_service:app --port 8001
+    python load_test.py --url http://localhost:8001 --clients 200 --seconds 60
+
+p50/p99 of the largest /alerts page (limit=1000, one query with the
+coordinates joined in):
+
+    python load_test.py --url http://localhost:8001 --paths alerts --clients 50
+
+Token validation and login throughput of auth_service, as an existing user
+(the script logs in once for the bearer token used on /users/me):
+
+    uvicorn auth_service:app --port 8000
+    python load_test.py --url http://localhost:8000 --paths auth \
+        --email loadtest@example.com --password secret --clients 100
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+
+import httpx
+
+# Entries are "path" (GET) or "POST path" (form POST of the login fields)
+PATH_SETS = {
+    # hot dashboard endpoints served through the Database facade
+    "dashboard": [
+        "/stats/severity",
+        "/stats/counts?days=30",
+        "/stats/avg_violence?days=30",
+        "/stats/activities?days=14",
+        "/stats/top_entities?limit=10",
+        "/map/geojson?days=7",
+        "/map/geojson?days=30&zoom=4",
+    ],
+    # list endpoint at its maximum page size
+    "alerts": [
+        "/alerts?limit=1000",
+    ],
+    # cached token validation and bcrypt-bound login
+    "auth": [
+        "/users/me",
+        "POST /token",
+    ],
+}
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * p))
+    return sorted_values[index]
+
+
+def send(client, entry, form):
+    method, _, path = entry.rpartition(" ")
+    if method == "POST":
+        return client.post(path, data=form)
+    return client.get(path)
+
+
+async def client_loop(client, paths, form, deadline, latencies, statuses):
+    while time.monotonic() < deadline:
+        entry = random.choice(paths)
+        start = time.perf_counter()
+        try:
+            response = await send(client, entry, form)
+            statuses[response.status_code] += 1
+        except httpx.HTTPError as e:
+            statuses[type(e).__name__] += 1
+            continue
+        latencies.setdefault(entry, []).append(time.perf_counter() - start)
+
+
+async def run(url, paths, clients, seconds, warmup, form=None):
+    limits = httpx.Limits(max_connections=clients,
+                          max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=url, timeout=30, limits=limits) as client:
+        if form:
+            response = await client.post("/token", data=form)
+            response.raise_for_status()
+            token = response.json()["access_token"]
+            client.headers["Authorization"] = f"Bearer {token}"
+        if warmup:
+            await asyncio.gather(*(send(client, p, form) for p in paths))
+
+        latencies, statuses = {}, Counter()
+        deadline = time.monotonic() + seconds
+        started = time.monotonic()
+        await asyncio.gather(*(client_loop(client, paths, form, deadline,
+                                           latencies, statuses)
+                               for _ in range(clients)))
+        elapsed = time.monotonic() - started
+
+    print(f"{clients} clients for {elapsed:.1f}s against {url}")
+    overall = sorted(t for ts in latencies.values() for t in ts)
+    print_line("all", overall, elapsed)
+    if len(latencies) > 1:
+        for entry in paths:
+            print_line(entry, sorted(latencies.get(entry, [])), elapsed)
+    print(f"  statuses: {dict(statuses)}")
+
+
+def print_line(label, latencies, elapsed):
+    print(f"  {label}: {len(latencies)} completed "
+          f"({len(latencies) / elapsed:.1f} req/s), "
+          f"p50 {percentile(latencies, 0.50) * 1000:.0f} ms, "
+          f"p95 {percentile(latencies, 0.95) * 1000:.0f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://localhost:8001")
+    parser.add_argument("--paths", choices=sorted(PATH_SETS), default="dashboard",
+                        help="endpoint set to hit (default dashboard)")
+    parser.add_argument("--clients", type=int, default=100,
+                        help="concurrent clients (default 100)")
+    parser.add_argument("--seconds", type=float, default=30,
+                        help="test duration (default 30)")
+    parser.add_argument("--no-warmup", action="store_true",
+                        help="skip one warm-up request per endpoint")
+    parser.add_argument("--email", help="existing user for --paths auth")
+    parser.add_argument("--password", help="that user's password")
+    args = parser.parse_args()
+
+    form = None
+    if args.paths == "auth":
+        if not (args.email and args.password):
+            parser.error("--paths auth needs --email and --password")
+        form = {"username": args.email, "password": args.password}
+    asyncio.run(run(args.url, PATH_SETS[args.paths], args.clients,
+                    args.seconds, not args.no_warmup, form))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,33 @@
 """
 Consume JSON alerts from Kafka, clean the HTML summary, enrich with
 lat/lon + NER + weapon tags, activities, and store in a Neon/PostGIS table.
+
+Work runs as a pipeline of stages (clean → NER → geocode → write) joined by
+bounded queues, so the rate-limited geocoder and DB round-trips don't idle
+the CPU-heavy NER stage. Kafka offsets are only committed once every
+earlier message of the partition has been written.
 """
 import json
 import os
+import queue
 import signal
 import sys
+import threading
 import time
+from collections import deque
 from datetime import datetime
 
 import psycopg2
-from confluent_kafka import Consumer, KafkaException
+from confluent_kafka import Consumer, KafkaException, TopicPartition
 from dotenv import load_dotenv
-from psycopg2 import OperationalError, InterfaceError
+from psycopg2 import DataError, IntegrityError, InterfaceError, OperationalError
+from psycopg2.extras import execute_values
 
-from geo_resolver import geocode_text            # spaCy + Nominatim helper
+from codec import decode
+from consumer_pipeline import BatchStage, OffsetTracker, Stage
+from geo_resolver import extract_entities, locate  # spaCy + Nominatim helpers
 from text_utils import html_to_text              # HTML→plain converter
+from rollups import apply_rollups, ensure_rollup_schema
 
 
 # Schema definition
@@ -36,10 +48,19 @@ CREATE TABLE IF NOT EXISTS alerts (
   language       text,
   image_url      text
 );
+ALTER TABLE alerts ADD COLUMN IF NOT EXISTS tone jsonb;
+ALTER TABLE alerts ADD COLUMN IF NOT EXISTS tone_attempts int NOT NULL DEFAULT 0;
+ALTER TABLE alerts ADD COLUMN IF NOT EXISTS tone_failed_at timestamptz;
+CREATE INDEX IF NOT EXISTS alerts_tone_pending_idx
+  ON alerts (fetched_at) WHERE tone IS NULL;
 CREATE INDEX IF NOT EXISTS alerts_geom_idx
   ON alerts USING GIST (geom);
 CREATE INDEX IF NOT EXISTS alerts_published_idx
   ON alerts (published_at);
+CREATE INDEX IF NOT EXISTS alerts_fetched_idx
+  ON alerts (fetched_at);
+CREATE INDEX IF NOT EXISTS alerts_published_id_idx
+  ON alerts (published_at DESC NULLS LAST, id DESC);
 """
 
 
@@ -59,13 +80,38 @@ INSERT INTO alerts(
   %(language)s,
   %(image_url)s
 )
-ON CONFLICT (id) DO NOTHING;
+ON CONFLICT (id) DO NOTHING
+RETURNING id;
 """
 
 
+SQL_INSERT_BATCH = """
+INSERT INTO alerts(
+  id, source, title, summary, published_at,
+  violence_score, fetched_at, geom, entities,
+  activities, severity_band, language, image_url
+) VALUES %s
+ON CONFLICT (id) DO NOTHING
+RETURNING id;
+"""
+
+BATCH_TEMPLATE = """(
+  %(id)s, %(source)s, %(title)s, %(summary)s,
+  %(published_at)s::timestamptz,
+  %(violence_score)s, %(fetched_at)s::timestamptz,
+  ST_SetSRID(ST_MakePoint(%(lon)s, %(lat)s),4326),
+  %(entities)s::jsonb,
+  %(activities)s,
+  %(severity_band)s,
+  %(language)s,
+  %(image_url)s
+)"""
+
+
 def ensure_schema(cur):
     """Ensure PostGIS extension and alerts table exist."""
     cur.execute(DDL)
+    ensure_rollup_schema(cur)
     print("✅  Schema ensured.")
 
 
@@ -84,23 +130,201 @@ def reconnect_db(dsn):
             time.sleep(5)
 
 
-def shutdown(consumer, cur, conn):
-    """Cleanup on exit."""
-    print("🛑  Shutting down…")
-    consumer.close()
-    cur.close()
-    conn.close()
-    print("✅  Shutdown complete.")
-    sys.exit(0)
+# ─── Pipeline stages; items are dicts that gain fields as they move along ────
+def clean_stage(item):
+    # an undecodable message is the only failure that drops an alert
+    record = decode(item["value"], item["headers"])
+    summary = record.get("summary") or ""
+    try:
+        clean_summary = html_to_text(summary)
+    except Exception as e:
+        print(f"⚠️  HTML cleanup failed for {record.get('id')}: {e!r}")
+        clean_summary = summary
+    item.update(
+        record=record,
+        summary=clean_summary,
+        text=f"{record.get('title','')} {clean_summary}",
+    )
+    return item
+
+
+def make_ner_stage(batch_size, n_process):
+    def ner_stage(items):
+        ents = extract_entities([i["text"] for i in items],
+                                batch_size=batch_size, n_process=n_process)
+        for item, item_ents in zip(items, ents):
+            item["entities"] = item_ents
+        return items
+    return ner_stage
+
+
+def geocode_stage(item):
+    item["lon"], item["lat"] = locate(item["entities"])
+    return item
+
+
+# Fallbacks so an NER or geocoder failure still stores the alert, just
+# without entities or coordinates
+def without_entities(item):
+    item["entities"] = []
+    return item
+
+
+def without_location(item):
+    item["lon"], item["lat"] = None, None
+    return item
+
+
+def db_params(item):
+    """Map one enriched pipeline item onto SQL_INSERT params."""
+    record = item["record"]
+    return {
+        "id":            record.get("id"),
+        "source":        record.get("source"),
+        "title":         record.get("title"),
+        "summary":       item["summary"],
+        "published_at":  record.get("published"),
+        "violence_score":record.get("violence_score"),
+        "fetched_at":    record.get("fetched_at"),
+        "lon":           item["lon"],
+        "lat":           item["lat"],
+        "entities":      json.dumps(item["entities"]),
+        "activities":    record.get("activities") or [],
+        "severity_band": record.get("severity_band"),
+        "language":      record.get("language","en"),
+        "image_url":     record.get("image_url"),
+    }
+
+
+class Writer:
+    """Write stage: owns the DB connection and inserts items in batches."""
+
+    def __init__(self, dsn):
+        self.dsn = dsn
+        self.conn, self.cur = reconnect_db(dsn)
+
+    def __call__(self, items):
+        self.conn, self.cur = write_batch(self.conn, self.cur, self.dsn,
+                                          [db_params(i) for i in items])
+        return items
+
+    def close(self):
+        self.cur.close()
+        self.conn.close()
+
+
+def write_batch(conn, cur, dsn, batch):
+    """
+    Insert `batch` in one statement, fold the rows that were actually
+    inserted into the daily rollups, and commit once.
+
+    On a lost connection the batch is retried on a fresh one; if the
+    batch itself is rejected, rows are retried one by one so a single
+    bad record doesn't sink the rest. A row is only given up on when the
+    database rejects its data; any other failure is raised, so the batch's
+    offsets are not released. Returns the (conn, cur) in use.
+    """
+    while True:
+        try:
+            inserted = execute_values(cur, SQL_INSERT_BATCH, batch,
+                                      template=BATCH_TEMPLATE,
+                                      page_size=len(batch), fetch=True)
+            apply_rollups(cur, [row[0] for row in inserted])
+            conn.commit()
+            print(f"✅  Inserted batch of {len(batch)} alerts")
+            return conn, cur
+        except (OperationalError, InterfaceError) as db_err:
+            print(f"⚠️  DB connection lost: {db_err!r}")
+            conn, cur = reconnect_db(dsn)
+        except Exception as e:
+            print(f"⚠️  Batch insert failed: {e!r}, retrying row by row",
+                  file=sys.stderr)
+            conn.rollback()
+            break
+
+    for params in batch:
+        while True:
+            try:
+                cur.execute(SQL_INSERT, params)
+                inserted = cur.fetchone()
+                if inserted:
+                    apply_rollups(cur, [inserted[0]])
+                conn.commit()
+                break
+            except (OperationalError, InterfaceError) as db_err:
+                # retry the same row on a fresh connection
+                print(f"⚠️  DB connection lost: {db_err!r}")
+                conn, cur = reconnect_db(dsn)
+            except (DataError, IntegrityError) as e:
+                # poison row: skip it so the rest of the batch goes through
+                print(f"⚠️  Insert failed for {params['id']}: {e!r}", file=sys.stderr)
+                conn.rollback()
+                break
+            except Exception:
+                conn.rollback()
+                raise
+    return conn, cur
+
+
+def report(stages, tracker, interval, last):
+    """Print queue depth and throughput per stage; returns the new counts."""
+    parts = []
+    counts = {}
+    for stage in stages:
+        stats = stage.report()
+        counts[stage.name] = stats["processed"]
+        rate = (stats["processed"] - last.get(stage.name, 0)) / interval
+        parts.append(f"{stage.name}: q={stats['queue']} {rate:.1f}/s")
+    print(f"[{datetime.utcnow():%Y-%m-%d %H:%M:%S}] 📊  "
+          + " | ".join(parts) + f" | in-flight={tracker.in_flight()}")
+    return counts
+
+
+def commit_offsets(consumer, tracker):
+    offsets = [TopicPartition(t, p, o)
+               for (t, p), o in tracker.committable().items()]
+    if offsets:
+        consumer.commit(offsets=offsets, asynchronous=False)
 
 
 def main():
     load_dotenv()
     dsn = os.getenv("PG_DSN")
     topic = os.getenv("NEWS_TOPIC", "news-violence")
+    batch_size = int(os.getenv("CONSUMER_BATCH_SIZE", "100"))
+    batch_ms = int(os.getenv("CONSUMER_BATCH_MS", "2000"))
+    ner_batch_size = int(os.getenv("NER_BATCH_SIZE", "32"))
+    ner_processes = int(os.getenv("NER_PROCESSES", "1"))
+    queue_size = int(os.getenv("STAGE_QUEUE_SIZE", "200"))
+    # keep the in-flight cap below what the four stage queues can hold, so
+    # fetching pauses before the main thread could block on a full queue
+    max_in_flight = int(os.getenv("MAX_IN_FLIGHT", str(2 * queue_size)))
+    stats_interval = float(os.getenv("STATS_INTERVAL", "30"))
+
+    # stages, each fed by a bounded queue; finished items land in done_q
+    clean_q, ner_q, geo_q, write_q = (queue.Queue(maxsize=queue_size)
+                                      for _ in range(4))
+    done_q = queue.Queue()
+    writer = Writer(dsn)
+    stages = [
+        Stage("clean", clean_stage, clean_q, ner_q,
+              workers=int(os.getenv("CLEAN_WORKERS", "2")), on_error=done_q.put),
+        BatchStage("ner", make_ner_stage(ner_batch_size, ner_processes),
+                   ner_q, geo_q, ner_batch_size, 0.2,
+                   workers=int(os.getenv("NER_WORKERS", "1")),
+                   fallback=without_entities),
+        Stage("geocode", geocode_stage, geo_q, write_q,
+              workers=int(os.getenv("GEOCODE_WORKERS", "2")),
+              fallback=without_location),
+        # no on_error: a failed write must keep its offset in flight
+        BatchStage("write", writer, write_q, done_q, batch_size,
+                   batch_ms / 1000.0),
+    ]
+    stop = threading.Event()
+    for stage in stages:
+        stage.start(stop)
 
-    # initial connect
-    conn, cur = reconnect_db(dsn)
+    tracker = OffsetTracker()
 
     # set up Kafka consumer
     consumer_conf = {
@@ -114,62 +338,84 @@ def main():
         "sasl.password": os.getenv("KAFKA_API_SECRET"),
     }
     consumer = Consumer(consumer_conf)
-    consumer.subscribe([topic])
+
+    def on_revoke(c, partitions):
+        commit_offsets(c, tracker)
+        tracker.forget([(tp.topic, tp.partition) for tp in partitions])
+
+    consumer.subscribe([topic], on_revoke=on_revoke)
 
     # hook signals
-    signal.signal(signal.SIGINT,  lambda *_: shutdown(consumer, cur, conn))
-    signal.signal(signal.SIGTERM, lambda *_: shutdown(consumer, cur, conn))
+    signal.signal(signal.SIGINT,  lambda *_: stop.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
 
     print(f"[{datetime.utcnow():%Y-%m-%d %H:%M:%S}] Listening on {topic}")
 
-    while True:
-        msg = consumer.poll(1.0)
-        if msg is None:
-            continue
-        if msg.error():
-            raise KafkaException(msg.error())
-
-        record = json.loads(msg.value())
-        clean_summary = html_to_text(record.get("summary") or "")
-        full_text = f"{record.get('title','')} {clean_summary}"
-        lon, lat, entities = geocode_text(full_text)
-
-        db_params = {
-            "id":            record.get("id"),
-            "source":        record.get("source"),
-            "title":         record.get("title"),
-            "summary":       clean_summary,
-            "published_at":  record.get("published"),
-            "violence_score":record.get("violence_score"),
-            "fetched_at":    record.get("fetched_at"),
-            "lon":           lon,
-            "lat":           lat,
-            "entities":      json.dumps(entities),
-            "activities":    record.get("activities") or [],
-            "severity_band": record.get("severity_band"),
-            "language":      record.get("language","en"),
-            "image_url":     record.get("image_url"),
-        }
+    paused = False
+    backlog = deque()   # fetched messages waiting for room in clean_q
+    last_report = time.monotonic()
+    last_counts = {}
 
-        try:
-            cur.execute(SQL_INSERT, db_params)
-            conn.commit()
-            consumer.commit(asynchronous=False)
-            print(f"✅  Inserted alert ID: {db_params['id']}")
-        except (OperationalError, InterfaceError) as db_err:
-            # lost connection: reconnect and skip this record
-            print(f"⚠️  DB connection lost: {db_err!r}")
-            conn, cur = reconnect_db(dsn)
-            continue
-        except Exception as e:
-            # other error: rollback and continue
-            print(f"⚠️  Insert failed for {db_params['id']}: {e!r}", file=sys.stderr)
+    while not stop.is_set():
+        # still polled while paused, so the group membership stays alive
+        msgs = consumer.consume(num_messages=batch_size, timeout=0.2)
+        for msg in msgs:
+            if msg.error():
+                raise KafkaException(msg.error())
+            tracker.add(msg.topic(), msg.partition(), msg.offset())
+            backlog.append({"tp_offset": (msg.topic(), msg.partition(), msg.offset()),
+                            "value": msg.value(), "headers": msg.headers()})
+
+        # never block on the stage queues: the main thread must keep
+        # polling Kafka and committing even if a later stage is stuck
+        while backlog:
             try:
-                conn.rollback()
-            except InterfaceError:
-                conn, cur = reconnect_db(dsn)
-            continue
+                clean_q.put_nowait(backlog[0])
+            except queue.Full:
+                break
+            backlog.popleft()
 
+        # release finished offsets and commit the contiguous ones
+        while True:
+            try:
+                item = done_q.get_nowait()
+            except queue.Empty:
+                break
+            tracker.done(*item["tp_offset"])
+        commit_offsets(consumer, tracker)
+
+        # backpressure: stop fetching while clean_q is full or too much is
+        # in flight
+        in_flight = tracker.in_flight()
+        if not paused and (backlog or in_flight >= max_in_flight):
+            consumer.pause(consumer.assignment())
+            paused = True
+        elif paused and not backlog and in_flight <= max_in_flight // 2:
+            consumer.resume(consumer.assignment())
+            paused = False
+
+        if time.monotonic() - last_report >= stats_interval:
+            last_counts = report(stages, tracker,
+                                 time.monotonic() - last_report, last_counts)
+            last_report = time.monotonic()
+
+    # Cleanup on exit; anything still in flight is redelivered next start.
+    # Let a write in progress finish before closing its connection.
+    print("🛑  Shutting down…")
+    write_stage = stages[-1]
+    write_stage.join(timeout=30)
+    while True:
+        try:
+            item = done_q.get_nowait()
+        except queue.Empty:
+            break
+        tracker.done(*item["tp_offset"])
+    commit_offsets(consumer, tracker)
+    consumer.close()
+    if not write_stage.alive():
+        writer.close()
+    print("✅  Shutdown complete.")
+    sys.exit(0)
 
 if __name__ == "__main__":
     main()
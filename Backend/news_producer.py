@@ -4,17 +4,25 @@ and tags them with one or more vulnerable-group activities, then publishes
 to Kafka.
 """
 
+import json
 import os
 import re
-import json
 import time
 from datetime import datetime
 
 from dotenv import load_dotenv
-import feedparser
-from transformers import pipeline
 from confluent_kafka import Producer
 
+from codec import ENCODING_HEADER, encode
+from clf_cache import CachedClassifier, ClassificationCache
+from dedup_store import make_dedup_store
+from prefilter import LexiconPrefilter
+from sharding import make_shard
+from feed_fetcher import fetch_all, load_feed_state, save_feed_state
+from zero_shot import get_classifier
+
+VIOLENCE_LABELS = ["violent", "non-violent"]
+
 
 def get_severity_band(score: float) -> str:
     """
@@ -31,6 +39,7 @@ def get_severity_band(score: float) -> str:
 
 def load_config() -> dict:
     load_dotenv() 
+    acks = os.getenv("KAFKA_ACKS", "all")
 
     rss_raw = os.getenv(
         "NEWS_RSS_URLS",
@@ -47,8 +56,38 @@ def load_config() -> dict:
         "api_key":           os.getenv("KAFKA_API_KEY"),
         "api_secret":        os.getenv("KAFKA_API_SECRET"),
         "topic":             os.getenv("NEWS_TOPIC", "news-violence"),
+        "encoding":          os.getenv("KAFKA_ENCODING", "json"),
+        "max_redeliveries":  int(os.getenv("KAFKA_MAX_REDELIVERIES", "3")),
+        "kafka_tuning": {
+            "linger.ms":          int(os.getenv("KAFKA_LINGER_MS", "50")),
+            "batch.size":         int(os.getenv("KAFKA_BATCH_BYTES", "262144")),
+            "compression.type":   os.getenv("KAFKA_COMPRESSION", "zstd"),
+            "acks":               acks,
+            # librdkafka refuses idempotence unless every replica acks
+            "enable.idempotence": acks in ("all", "-1"),
+            # feeds WireStats (compressed bytes sent); 0 disables
+            "statistics.interval.ms": int(os.getenv("KAFKA_STATS_INTERVAL_MS", "10000")),
+        },
         "violence_thresh":   float(os.getenv("VIOLENCE_THRESHOLD", "0.6")),
         "activity_thresh":   float(os.getenv("ACTIVITY_THRESHOLD", "0.3")),
+        "clf_batch_size":    int(os.getenv("CLF_BATCH_SIZE", "16")),
+        "feed_timeout":      float(os.getenv("FEED_TIMEOUT", "10")),
+        "feed_concurrency":  int(os.getenv("FEED_CONCURRENCY", "8")),
+        "feed_state_path":   os.getenv("FEED_STATE_PATH", "feed_state.json"),
+        "dedup_backend":     os.getenv("DEDUP_BACKEND", "sqlite"),
+        "dedup_path":        os.getenv("DEDUP_PATH", "seen_ids.sqlite3"),
+        "dedup_ttl_days":    float(os.getenv("DEDUP_TTL_DAYS", "7")),
+        "dedup_bloom_capacity": int(os.getenv("DEDUP_BLOOM_CAPACITY", "1000000")),
+        "clf_cache_size":    int(os.getenv("CLF_CACHE_SIZE", "10000")),
+        "clf_cache_dir":     os.getenv("CLF_CACHE_DIR", ""),
+        "shard_mode":        os.getenv("SHARD_MODE", "none"),
+        "shard_index":       int(os.getenv("PRODUCER_INSTANCE", "0")),
+        "shard_count":       int(os.getenv("PRODUCER_COUNT", "1")),
+        "shard_topic":       os.getenv("SHARD_TOPIC", "news-producer-shards"),
+        "shard_group":       os.getenv("SHARD_GROUP", "news-producers"),
+        "prefilter":         os.getenv("PREFILTER", "off"),
+        "prefilter_recall":  float(os.getenv("PREFILTER_TARGET_RECALL", "0.95")),
+        "prefilter_audit":   float(os.getenv("PREFILTER_AUDIT_RATE", "0.1")),
         "activity_labels": [
             a.strip() for a in os.getenv("NEWS_ACTIVITIES", "").split(",")
             if a.strip()
@@ -58,7 +97,14 @@ def load_config() -> dict:
 
 def make_producer(bootstrap: str,
                   api_key: str,
-                  api_secret: str) -> Producer:
+                  api_secret: str,
+                  tuning: dict = None,
+                  stats_cb=None) -> Producer:
+    """
+    Build the Kafka producer; `tuning` adds batching/linger/compression
+    settings (see load_config()["kafka_tuning"]) and `stats_cb` receives
+    librdkafka's periodic statistics JSON.
+    """
     config = {
         "bootstrap.servers": bootstrap,
         "security.protocol": "SASL_SSL",
@@ -66,113 +112,399 @@ def make_producer(bootstrap: str,
         "sasl.username":     api_key,
         "sasl.password":     api_secret,
     }
+    config.update(tuning or {})
+    if stats_cb is not None:
+        config["stats_cb"] = stats_cb
     return Producer(config)
 
 
-def make_classifiers() -> tuple:
+class WireStats:
     """
-    Initialize and return zero-shot pipelines for violence and activities.
+    librdkafka `stats_cb`: turns the cumulative `txbytes` counter (bytes
+    sent to brokers, after compression) into a per-cycle figure.
     """
-    violence_clf = pipeline(
-        "zero-shot-classification",
-        model="facebook/bart-large-mnli"
-    )
-    activity_clf = pipeline(
-        "zero-shot-classification",
-        model="facebook/bart-large-mnli"
-    )
-    return violence_clf, activity_clf
+
+    def __init__(self):
+        self.txbytes = None   # latest cumulative value
+        self._last = 0
+
+    def __call__(self, stats_json: str) -> None:
+        self.txbytes = json.loads(stats_json).get("txbytes", 0)
+
+    def reset_stats(self):
+        """Bytes sent since the previous call, or None without stats yet."""
+        if self.txbytes is None:
+            return None
+        sent, self._last = self.txbytes - self._last, self.txbytes
+        return sent
+
+
+class DeliveryTracker:
+    """
+    Delivery-report callback: counts delivered messages, uncompressed
+    value bytes and broker latency, and keeps failed messages so they can
+    be produced again. A story id is only added to `seen_ids` once its
+    message is acknowledged; the feeds of dropped stories are reported by
+    take_dropped_feeds() so the caller can forget their validators and
+    refetch them in full, which retries the story.
+    """
+
+    def __init__(self, max_redeliveries: int, seen_ids):
+        self.max_redeliveries = max_redeliveries
+        self.seen_ids = seen_ids
+        self.attempts = {}
+        self.failed = []
+        self.pending = {}      # key -> feed url, produced but not yet acknowledged
+        self.dropped_feeds = set()
+        self._reset()
+
+    def _reset(self):
+        self.stats = {"delivered": 0, "failed": 0, "retried": 0,
+                      "dropped": 0, "value_bytes": 0, "latency": 0.0}
+
+    def track(self, key: bytes, feed_url: str) -> None:
+        self.pending[key] = feed_url
+
+    def __call__(self, err, msg):
+        key = msg.key()
+        if err is None:
+            self.attempts.pop(key, None)
+            self.pending.pop(key, None)
+            self.seen_ids.add(key.decode("utf-8"))
+            self.stats["delivered"] += 1
+            self.stats["value_bytes"] += len(msg.value())
+            self.stats["latency"] += msg.latency() or 0.0
+            return
+
+        self.stats["failed"] += 1
+        attempt = self.attempts.get(key, 0) + 1
+        if attempt > self.max_redeliveries:
+            self.attempts.pop(key, None)
+            feed_url = self.pending.pop(key, None)
+            if feed_url:
+                self.dropped_feeds.add(feed_url)
+            self.stats["dropped"] += 1
+            print(f"⚠️ giving up on {key!r} after {attempt - 1} redeliveries → {err}")
+            return
+        self.attempts[key] = attempt
+        self.failed.append((msg.topic(), key, msg.value(), msg.headers()))
+
+    def redeliver(self, producer: Producer) -> None:
+        failed, self.failed = self.failed, []
+        for topic, key, value, headers in failed:
+            producer.produce(topic, value, key=key, headers=headers,
+                             on_delivery=self)
+            self.stats["retried"] += 1
+
+    def take_dropped_feeds(self) -> set:
+        dropped, self.dropped_feeds = self.dropped_feeds, set()
+        return dropped
+
+    def reset_stats(self) -> dict:
+        stats = self.stats
+        self._reset()
+        return stats
+
+
+def make_classifiers(activity_labels: list = None) -> tuple:
+    """
+    Return zero-shot classifiers for violence and activities.
+
+    Both share one set of model weights from the zero-shot registry; the
+    hypotheses for each label set are encoded up front.
+    """
+    clf = get_classifier()
+    clf.prepare(VIOLENCE_LABELS)
+    if activity_labels:
+        clf.prepare(activity_labels)
+    return clf, clf
+
+
+def chunked(items: list, size: int):
+    """
+    Yield successive slices of `items` with at most `size` elements.
+    """
+    size = max(1, size)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def collect_entries(cfg: dict, urls: list, seen_ids, feed_state: dict) -> tuple:
+    """
+    Fetch each of `urls` once (concurrently, skipping feeds that answer 304)
+    and return (entries, validators): the new, non-empty entries of this
+    cycle as dicts (uid, feed_url, source, title, summary, published,
+    snippet), and the new {url: validators} to store once they're handled.
+    """
+    entries = []
+    cycle_ids = set()
+
+    feeds, validators = fetch_all(urls, feed_state,
+                                  cfg["feed_timeout"], cfg["feed_concurrency"])
+
+    for url, feed in feeds:
+        source = feed.feed.get("title", url)
+
+        for entry in feed.entries[: cfg["max_per_feed"]]:
+            uid = entry.get("id") or entry.get("link")
+            if not uid or uid in seen_ids or uid in cycle_ids:
+                continue
+
+            title = (entry.get("title") or "").strip()
+            summary = (entry.get("summary")
+                       or entry.get("description")
+                       or "").strip()
+            text = f"{title} {summary}".strip()
+            if not text:
+                continue
+
+            cycle_ids.add(uid)
+            entries.append({
+                "uid":       uid,
+                "feed_url":  url,
+                "source":    source,
+                "title":     title,
+                "summary":   summary,
+                "published": entry.get("published"),
+                "snippet":   text[:512],
+            })
+
+    return entries, validators
+
+
+def score_violence(entries: list, violence_clf, batch_size: int) -> list:
+    """
+    Run violence scoring over `entries` in batches and return
+    (entry, score) pairs. A failing batch is logged and dropped.
+    """
+    scored = []
+
+    for batch in chunked(entries, batch_size):
+        snippets = [e["snippet"] for e in batch]
+        try:
+            results = violence_clf(snippets, VIOLENCE_LABELS,
+                                   batch_size=batch_size)
+        except Exception as exc:
+            print(f"⚠️ violence error on batch of {len(batch)} → {exc}")
+            continue
+
+        for entry, res_v in zip(batch, results):
+            scores = dict(zip(res_v["labels"], res_v["scores"]))
+            scored.append((entry, scores.get("violent", 0.0)))
+
+    return scored
+
+
+def tag_activities(entries: list, activity_clf, labels: list,
+                   thresh: float, batch_size: int) -> list:
+    """
+    Run activity tagging over `entries` in batches and return one list
+    of activity labels per entry (["other"] when nothing matches).
+    """
+    tagged = []
+
+    for batch in chunked(entries, batch_size):
+        snippets = [e["snippet"] for e in batch]
+        try:
+            results = activity_clf(snippets, labels, batch_size=batch_size)
+        except Exception as exc:
+            print(f"⚠️ activity error on batch of {len(batch)} → {exc}")
+            results = [None] * len(batch)
+
+        for res_a in results:
+            activities = []
+            if res_a:
+                activities = [
+                    lbl for lbl, sc in zip(res_a["labels"], res_a["scores"])
+                    if sc >= thresh
+                ]
+            tagged.append(activities or ["other"])
+
+    return tagged
 
 
 def poll_and_produce(cfg: dict,
                      producer: Producer,
                      violence_clf,
-                     activity_clf) -> None:
+                     activity_clf,
+                     wire_stats: "WireStats" = None) -> None:
     """
     Continuously poll RSS feeds, classify entries, and send matching
     records to Kafka.
+
+    Each cycle collects the new entries of every feed first, scores them
+    for violence in batches of `clf_batch_size`, and only tags the
+    survivors with activities as a second batched pass. Results are cached
+    by normalized text, so syndicated copies of a story are scored once.
     """
-    seen_ids = set()
-    candidates_v = ["violent", "non-violent"]
+    cache = ClassificationCache(cfg["clf_cache_size"],
+                                cfg["clf_cache_dir"] or None)
+    violence_clf = CachedClassifier(violence_clf, cache)
+    activity_clf = CachedClassifier(activity_clf, cache)
+    seen_ids = make_dedup_store(cfg)
+    shard = make_shard(cfg)
+    prefilter = None
+    if cfg["prefilter"] == "lexicon":
+        prefilter = LexiconPrefilter(cfg["prefilter_recall"],
+                                     cfg["prefilter_audit"])
+    batch_size = cfg["clf_batch_size"]
+    delivery = DeliveryTracker(cfg["max_redeliveries"], seen_ids)
+    headers = [(ENCODING_HEADER, cfg["encoding"].encode("utf-8"))]
+    feed_state = load_feed_state(cfg["feed_state_path"])
 
     print(f"[{datetime.utcnow().isoformat()}] Starting poller; feeds="
           f"{cfg['rss_urls']}")
 
-    while True:
-        batch_count = 0
-
-        for url in cfg["rss_urls"]:
-            feed = feedparser.parse(url)
-            source = feed.feed.get("title", url)
-
-            for entry in feed.entries[: cfg["max_per_feed"]]:
-                uid = entry.get("id") or entry.get("link")
-                if not uid or uid in seen_ids:
-                    continue
-
-                title = (entry.get("title") or "").strip()
-                summary = (entry.get("summary")
-                           or entry.get("description")
-                           or "").strip()
-                text = f"{title} {summary}".strip()
-                if not text:
-                    continue
-
-                # 1) Violence scoring
-                snippet = text[:512]
-                try:
-                    res_v = violence_clf(snippet, candidates_v)
-                    scores = dict(zip(res_v["labels"], res_v["scores"]))
-                    v_score = scores.get("violent", 0.0)
-                except Exception as exc:
-                    print(f"⚠️ {source}: violence error → {exc}")
-                    continue
-
+    try:
+        while True:
+            batch_count = 0
+            delivery.redeliver(producer)
+
+            # 1) Collect new entries across the feeds this instance owns
+            urls = shard.select(cfg["rss_urls"])
+            entries, new_validators = collect_entries(cfg, urls, seen_ids,
+                                                      feed_state)
+            # stories still awaiting a delivery report aren't seen yet
+            entries = [e for e in entries
+                       if e["uid"].encode("utf-8") not in delivery.pending]
+
+            # 2) Cheap lexicon prefilter, then violence scoring
+            audit_ids = set()
+            if prefilter is not None:
+                forward, audit, skipped = prefilter.split(entries)
+                for entry in skipped:
+                    seen_ids.add(entry["uid"])
+                audit_ids = {e["uid"] for e in audit}
+                entries = forward + audit
+
+            scored = score_violence(entries, violence_clf, batch_size)
+            # feeds with an unscored entry keep their old validators, so the
+            # next cycle refetches them instead of getting a 304
+            scored_ids = {e["uid"] for e, _ in scored}
+            for entry in entries:
+                if entry["uid"] not in scored_ids:
+                    new_validators.pop(entry["feed_url"], None)
+            if prefilter is not None:
+                violent = [e["uid"] for e, s in scored if s >= cfg["violence_thresh"]]
+                audited = sum(1 for e, _ in scored if e["uid"] in audit_ids)
+                audited_violent = sum(1 for uid in violent if uid in audit_ids)
+                prefilter.record(len(violent) - audited_violent,
+                                 audited, audited_violent)
+
+            for entry, v_score in scored:
                 if v_score < cfg["violence_thresh"]:
-                    continue
-
-                # 2) Activity tagging
-                try:
-                    res_a = activity_clf(snippet, cfg["activity_labels"])
-                    activities = [
-                        lbl for lbl, sc in zip(res_a["labels"],
-                                               res_a["scores"])
-                        if sc >= cfg["activity_thresh"]
-                    ]
-                except Exception as exc:
-                    print(f"⚠️ {source}: activity error → {exc}")
-                    activities = []
-
-                if not activities:
-                    activities = ["other"]
-
-                # 3) Build payload
+                    # scores are deterministic; never pay for this entry again
+                    seen_ids.add(entry["uid"])
+            survivors = [(e, s) for e, s in scored
+                         if s >= cfg["violence_thresh"]]
+
+            # 3) Activity tagging on survivors only
+            tagged = tag_activities([e for e, _ in survivors],
+                                    activity_clf,
+                                    cfg["activity_labels"],
+                                    cfg["activity_thresh"],
+                                    batch_size)
+
+            for (entry, v_score), activities in zip(survivors, tagged):
+                # 4) Build payload
                 record = {
-                    "id":              uid,
-                    "source":          source,
-                    "title":           title,
-                    "summary":         summary,
-                    "published":       entry.get("published"),
+                    "id":              entry["uid"],
+                    "source":          entry["source"],
+                    "title":           entry["title"],
+                    "summary":         entry["summary"],
+                    "published":       entry["published"],
                     "violence_score":  round(v_score, 3),
                     "severity_band":   get_severity_band(v_score),
                     "activities":      activities,
                     "fetched_at":      datetime.utcnow().isoformat(),
                 }
 
-                # 4) Produce to Kafka
+                # 5) Produce to Kafka
+                # keyed by story id so copies from other shards land on the
+                # same partition and dedupe downstream; the id is marked
+                # seen by the delivery report once the broker has it
+                key = entry["uid"].encode("utf-8")
                 producer.produce(
                     cfg["topic"],
-                    json.dumps(record).encode("utf-8")
+                    encode(record, cfg["encoding"]),
+                    key=key,
+                    headers=headers,
+                    on_delivery=delivery,
                 )
-                seen_ids.add(uid)
+                delivery.track(key, entry["feed_url"])
+                producer.poll(0)
                 batch_count += 1
 
-        if batch_count:
-            producer.flush()
-            print(f"[{datetime.utcnow().isoformat()}] → Produced "
-                  f"{batch_count} records to {cfg['topic']}")
-
-        time.sleep(cfg["poll_interval"])
+            if batch_count:
+                print(f"[{datetime.utcnow().isoformat()}] → Produced "
+                      f"{batch_count} records to {cfg['topic']}")
+
+            # serve delivery reports without blocking on a flush
+            producer.poll(0)
+            d_stats = delivery.reset_stats()
+            txbytes = wire_stats.reset_stats() if wire_stats else None
+            if d_stats["delivered"] or d_stats["failed"]:
+                avg_ms = d_stats["latency"] / max(d_stats["delivered"], 1) * 1000
+                wire = "" if txbytes is None else f", {txbytes} bytes on the wire"
+                print(f"[{datetime.utcnow().isoformat()}] Delivery: "
+                      f"{d_stats['delivered']} ok ({d_stats['value_bytes']} "
+                      f"uncompressed value bytes{wire}, "
+                      f"avg {avg_ms:.0f} ms), {d_stats['failed']} failed, "
+                      f"{d_stats['retried']} retried, "
+                      f"{d_stats['dropped']} dropped")
+
+            v_stats = violence_clf.reset_stats()
+            a_stats = activity_clf.reset_stats()
+            hits = v_stats["hits"] + a_stats["hits"]
+            lookups = hits + v_stats["misses"] + a_stats["misses"]
+            if lookups:
+                saved = v_stats["saved_seconds"] + a_stats["saved_seconds"]
+                print(f"[{datetime.utcnow().isoformat()}] Classification cache: "
+                      f"{hits}/{lookups} hits ({hits / lookups:.0%}), "
+                      f"~{saved:.1f}s inference saved")
+
+            if prefilter is not None:
+                p_stats = prefilter.reset_stats()
+                recall = p_stats["recall"]
+                print(f"[{datetime.utcnow().isoformat()}] Prefilter: skipped "
+                      f"{p_stats['skipped']} BART calls, forwarded "
+                      f"{p_stats['forwarded']}, audited {p_stats['audited']}, "
+                      f"est. recall "
+                      f"{'n/a' if recall is None else f'{recall:.1%}'}")
+
+            seen_ids.evict_expired()
+
+            # Only remember validators once the cycle's entries are handled;
+            # a feed with a dropped story is refetched in full next cycle
+            feed_state.update(new_validators)
+            for url in delivery.take_dropped_feeds():
+                feed_state.pop(url, None)
+            try:
+                save_feed_state(cfg["feed_state_path"], feed_state)
+            except OSError as exc:
+                print(f"⚠️ could not save feed state → {exc}")
+
+            # sleep while serving delivery callbacks
+            deadline = time.monotonic() + cfg["poll_interval"]
+            while (remaining := deadline - time.monotonic()) > 0:
+                producer.poll(remaining)
+
+    finally:
+        # leave the shard group promptly so peers take over our feeds
+        shard.close()
+        # give failed messages one more try before the final flush
+        delivery.redeliver(producer)
+        producer.flush(10)
+        # stories still unacknowledged are refetched by the next run
+        unsent = delivery.take_dropped_feeds() | set(delivery.pending.values())
+        if unsent:
+            for url in unsent:
+                feed_state.pop(url, None)
+            try:
+                save_feed_state(cfg["feed_state_path"], feed_state)
+            except OSError as exc:
+                print(f"⚠️ could not save feed state → {exc}")
+        seen_ids.close()
 
 
 def main() -> None:
@@ -180,13 +512,16 @@ def main() -> None:
     Entry point: load config, init components, and start polling loop.
     """
     cfg = load_config()
+    wire_stats = WireStats()
     producer = make_producer(cfg["bootstrap_servers"],
                              cfg["api_key"],
-                             cfg["api_secret"])
-    violence_clf, activity_clf = make_classifiers()
+                             cfg["api_secret"],
+                             cfg["kafka_tuning"],
+                             wire_stats)
+    violence_clf, activity_clf = make_classifiers(cfg["activity_labels"])
 
     try:
-        poll_and_produce(cfg, producer, violence_clf, activity_clf)
+        poll_and_produce(cfg, producer, violence_clf, activity_clf, wire_stats)
     except KeyboardInterrupt:
         print("Shutting down on user interrupt")
 
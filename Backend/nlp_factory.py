@@ -1,35 +1,107 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
 import spacy
 from spacy.pipeline import EntityRuler
 from pathlib import Path
 
-def build_pipeline():
-    nlp = spacy.load("en_core_web_trf")  # or "en_core_web_sm"
-    # 1) register the ruler before ner
-    nlp.add_pipe("entity_ruler", before="ner")
-    ruler = nlp.get_pipe("entity_ruler")
+from violence_terms import INJURY_TERMS, VIOLENT_ACT_TERMS, weapon_terms
+
+# NER model tiers, cheapest first
+MODEL_TIERS = {
+    "sm":  "en_core_web_sm",
+    "md":  "en_core_web_md",
+    "lg":  "en_core_web_lg",
+    "trf": "en_core_web_trf",
+}
+
+# seconds spent building/loading each pipeline, keyed by tier
+LOAD_TIMINGS = {}
+
+_pipelines = {}
+_pipelines_lock = threading.Lock()   # NER workers may ask for it at once
 
-    # 2) load your weapon terms
+
+def ruler_patterns():
+    # 1) load your weapon terms
     weapon_patterns = [
         {"label": "WEAPON", "pattern": term}
-        for term in Path("weapon_terms.txt").read_text().splitlines()
-        if term.strip()
+        for term in weapon_terms()
     ]
 
-    # 3) add a list of common violent-act terms
+    # 2) add a list of common violent-act terms
     act_patterns = [
         {"label": "VIOLENT_ACT", "pattern": pat}
-        for pat in [
-            "shooting", "bombing", "stabbed", "hijack", "attack", "assassination",
-            "explosion", "arson", "beating", "torture", "kidnapping", "massacre",
-        ]
+        for pat in VIOLENT_ACT_TERMS
     ]
 
-    # 4) add injury terms 
+    # 3) add injury terms
     injury_patterns = [
         {"label": "INJURY", "pattern": pat}
-        for pat in ["killed", "wounded", "injured", "casualties", "fatalities"]
+        for pat in INJURY_TERMS
     ]
 
-    # 5) combine & register all patterns
-    ruler.add_patterns(weapon_patterns + act_patterns + injury_patterns)
+    return weapon_patterns + act_patterns + injury_patterns
+
+
+def _cache_path(cache_dir, model, patterns):
+    # key on model, spaCy version and patterns so edits invalidate the cache
+    digest = hashlib.sha1(
+        json.dumps([model, spacy.__version__, patterns]).encode("utf-8")
+    ).hexdigest()[:12]
+    return Path(cache_dir) / f"{model}-{digest}"
+
+
+def build_pipeline(tier=None, cache_dir=None):
+    """
+    Load the spaCy model for `tier` (sm/md/lg/trf, default NER_MODEL_TIER)
+    with the weapon/violence EntityRuler before "ner".
+
+    With a `cache_dir` (default NLP_CACHE_DIR) the built pipeline, ruler
+    patterns included, is saved with nlp.to_disk and reloaded from there.
+    """
+    tier = tier or os.getenv("NER_MODEL_TIER", "trf")
+    if tier not in MODEL_TIERS:
+        raise ValueError(f"Unknown NER model tier: {tier!r}")
+    model = MODEL_TIERS[tier]
+    cache_dir = cache_dir or os.getenv("NLP_CACHE_DIR")
+
+    start = time.perf_counter()
+    patterns = ruler_patterns()
+    cached = _cache_path(cache_dir, model, patterns) if cache_dir else None
+
+    from_cache = cached is not None and cached.exists()
+    if from_cache:
+        nlp = spacy.load(cached)
+    else:
+        nlp = spacy.load(model)
+        # register the ruler before ner, then add all patterns
+        nlp.add_pipe("entity_ruler", before="ner")
+        nlp.get_pipe("entity_ruler").add_patterns(patterns)
+        if cached is not None:
+            # write aside and rename, so a crash never leaves a partial cache
+            tmp = cached.with_name(f"{cached.name}.tmp-{os.getpid()}")
+            nlp.to_disk(tmp)
+            try:
+                tmp.replace(cached)
+            except OSError:
+                # another process saved it first; keep that one
+                shutil.rmtree(tmp, ignore_errors=True)
+
+    LOAD_TIMINGS[tier] = time.perf_counter() - start
+    print(f"✅  Loaded spaCy {model} in {LOAD_TIMINGS[tier]:.1f}s"
+          f"{' (cached)' if from_cache else ''}")
     return nlp
+
+
+def get_pipeline(tier=None):
+    """Return the pipeline for `tier`, building it on first use."""
+    tier = tier or os.getenv("NER_MODEL_TIER", "trf")
+    with _pipelines_lock:
+        if tier not in _pipelines:
+            _pipelines[tier] = build_pipeline(tier)
+    return _pipelines[tier]
@@ -0,0 +1,126 @@
+# prefilter.py
+"""
+Cheap first stage of the producer's violence cascade.
+
+Entries that contain none of the violence lexicon terms are rejected
+without paying for a BART pass. To keep recall honest, a random sample of
+the rejected entries is still sent to BART ("audited"); if the estimated
+recall drops below the target the prefilter stops rejecting anything until
+the estimate recovers. The estimate decays rather than resets, so older
+traffic fades out without leaving the filter unguarded.
+"""
+import random
+import re
+
+from violence_terms import INJURY_TERMS, VIOLENT_ACT_TERMS, weapon_terms
+
+# Extra words that commonly appear in violent headlines. Terms match whole
+# words (plus a plural "s"), so inflections are listed explicitly rather
+# than matched as prefixes ("war" must not match "warning").
+EXTRA_TERMS = [
+    "kill", "killed", "killing", "killer", "dead", "death", "die", "dies",
+    "died", "dying", "shot", "shooter", "gun", "gunfire", "gunman", "gunmen",
+    "stab", "stabbing", "bomb", "bombed", "bomber", "blast", "assault",
+    "assaulted", "attacked", "attacker", "war", "militant", "rebel", "clash",
+    "clashes", "clashed", "strike", "airstrike", "raid", "raided", "hostage",
+    "murder", "murdered", "violence", "violent", "riot", "rioting", "rioter",
+    "terror", "terrorist", "terrorism", "abduct", "abducted", "abduction",
+    "rape", "raped", "abuse", "abused", "shell", "shelled", "shelling",
+    "fight", "fighting", "fighter", "fought", "hijacked", "hijacking",
+    "kidnap", "kidnapped",
+]
+
+
+class LexiconPrefilter:
+    """
+    Keyword gate in front of BART with an audited recall guard.
+
+    `split()` sorts a cycle's entries into forwarded, audited and skipped;
+    `record()` feeds back how many of them BART found violent. Once the
+    estimated recall falls below `target_recall` the filter trips and
+    audits every rejected entry until the estimate is back on target.
+    Counts are halved every `window` rejected entries.
+    """
+
+    def __init__(self, target_recall: float = 0.95, audit_rate: float = 0.1,
+                 min_audits: int = 50, window: int = 2000):
+        terms = sorted(set(weapon_terms() + VIOLENT_ACT_TERMS
+                           + INJURY_TERMS + EXTRA_TERMS), key=len, reverse=True)
+        self.pattern = re.compile(
+            r"\b(?:" + "|".join(re.escape(t) for t in terms) + r")s?\b",
+            re.IGNORECASE,
+        )
+        self.target_recall = target_recall
+        self.audit_rate = audit_rate
+        self.min_audits = min_audits
+        self.window = window
+        self.kept_violent = 0
+        self.rejected_total = 0
+        self.audited_total = 0
+        self.audited_violent = 0
+        self._tripped = False
+        self.cycle = {"forwarded": 0, "skipped": 0, "audited": 0}
+
+    def _decay(self):
+        # halve instead of resetting, so the estimate never goes blank
+        self.kept_violent /= 2
+        self.rejected_total /= 2
+        self.audited_total /= 2
+        self.audited_violent /= 2
+
+    def is_candidate(self, text: str) -> bool:
+        return self.pattern.search(text) is not None
+
+    def estimated_recall(self):
+        """
+        Share of violent entries the prefilter lets through, extrapolated
+        from the audited sample; None until enough audits are in.
+        """
+        if self.audited_total < self.min_audits:
+            return None
+        missed = self.audited_violent * self.rejected_total / self.audited_total
+        found = self.kept_violent + missed
+        return self.kept_violent / found if found else 1.0
+
+    @property
+    def tripped(self) -> bool:
+        """Latched: only a fresh estimate at or above target clears it."""
+        return self._tripped
+
+    def split(self, entries: list) -> tuple:
+        """
+        Return (forward, audit, skipped): entries for BART, rejected entries
+        sampled for BART anyway, and rejected entries that skip BART.
+        """
+        forward, audit, skipped = [], [], []
+        tripped = self.tripped
+        if self.rejected_total > self.window:
+            # fade out old traffic so it doesn't dominate the estimate
+            self._decay()
+        for entry in entries:
+            if self.is_candidate(entry["snippet"]):
+                forward.append(entry)
+            elif tripped or random.random() < self.audit_rate:
+                audit.append(entry)
+            else:
+                skipped.append(entry)
+
+        self.rejected_total += len(audit) + len(skipped)
+        self.cycle["forwarded"] += len(forward)
+        self.cycle["audited"] += len(audit)
+        self.cycle["skipped"] += len(skipped)
+        return forward, audit, skipped
+
+    def record(self, forwarded_violent: int, audited: int, audited_violent: int):
+        """Feed back how many forwarded/audited entries BART called violent."""
+        self.kept_violent += forwarded_violent
+        self.audited_total += audited
+        self.audited_violent += audited_violent
+        recall = self.estimated_recall()
+        if recall is not None:
+            self._tripped = recall < self.target_recall
+
+    def reset_stats(self) -> dict:
+        stats = dict(self.cycle, recall=self.estimated_recall())
+        self.cycle = {"forwarded": 0, "skipped": 0, "audited": 0}
+        return stats
@@ -0,0 +1,184 @@
+# response_cache.py
+"""
+Short-TTL cache for read-only endpoint results.
+
+Entries are tagged with a data version (the ingest sequence and newest
+fetched_at) and dropped as soon as new alerts land. Concurrent misses on
+the same key are coalesced: one request computes, the others wait and
+reuse its result.
+Values live in a bounded in-process TLRU cache, or in a diskcache store
+shared by all workers on the host when `shared_dir` is given. Both sync
+and async (coroutine) handlers are supported.
+"""
+import asyncio
+import functools
+import inspect
+import threading
+import time
+
+from cachetools import TLRUCache
+
+
+class ResponseCache:
+
+    def __init__(self, ttl: float, version_ttl: float = 2.0, shared_dir: str = None,
+                 maxsize: int = 1024):
+        self.ttl = ttl
+        self.version_ttl = version_ttl
+        self.shared = bool(shared_dir)
+        if shared_dir:
+            import diskcache
+            self.store = diskcache.Cache(shared_dir)
+        else:
+            # entries are (version, expires_at, value); expire each on its own
+            self.store = TLRUCache(maxsize=max(1, maxsize),
+                                   ttu=lambda key, entry, now: entry[1],
+                                   timer=time.time)
+        self._store_lock = threading.Lock()   # TLRUCache isn't thread-safe
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0}
+        self._locks = {}          # key -> [lock, users], dropped when unused
+        self._locks_guard = threading.Lock()
+        self._version = (None, 0.0)
+        self._version_lock = threading.Lock()
+        self._async_locks = {}
+        self._async_version_lock = None
+
+    def version(self, fetch_version):
+        """
+        Current data version, refreshed via `fetch_version()` at most once
+        every `version_ttl` seconds.
+        """
+        with self._version_lock:
+            value, checked_at = self._version
+            if time.monotonic() - checked_at >= self.version_ttl:
+                value = fetch_version()
+                self._version = (value, time.monotonic())
+            return value
+
+    async def aversion(self, fetch_version):
+        """Async `version()`: `fetch_version` is a coroutine function."""
+        if self._async_version_lock is None:
+            self._async_version_lock = asyncio.Lock()
+        async with self._async_version_lock:
+            value, checked_at = self._version
+            if time.monotonic() - checked_at >= self.version_ttl:
+                value = await fetch_version()
+                self._version = (value, time.monotonic())
+            return value
+
+    def _get(self, key):
+        if self.shared:
+            return self.store.get(key)
+        with self._store_lock:
+            return self.store.get(key)
+
+    def _set(self, key, version, value, ttl):
+        ttl = ttl or self.ttl
+        entry = (version, time.time() + ttl, value)
+        if self.shared:
+            self.store.set(key, entry, expire=ttl)
+            return
+        with self._store_lock:
+            self.store[key] = entry
+
+    def _lookup(self, key, version):
+        entry = self._get(key)
+        if entry is None:
+            return None
+        entry_version, expires_at, value = entry
+        if entry_version != version or expires_at < time.time():
+            return None
+        return (value,)
+
+    def _acquire_key_lock(self, key):
+        with self._locks_guard:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        entry[0].acquire()
+        return entry
+
+    def _release_key_lock(self, key, entry):
+        entry[0].release()
+        with self._locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    def get_or_compute(self, key, version, compute, ttl: float = None):
+        found = self._lookup(key, version)
+        if found is not None:
+            self.stats["hits"] += 1
+            return found[0]
+
+        lock = self._acquire_key_lock(key)
+        try:
+            # someone else may have filled it while we waited
+            found = self._lookup(key, version)
+            if found is not None:
+                self.stats["coalesced"] += 1
+                return found[0]
+            self.stats["misses"] += 1
+            value = compute()
+            self._set(key, version, value, ttl)
+        finally:
+            self._release_key_lock(key, lock)
+        return value
+
+    async def aget_or_compute(self, key, version, compute, ttl: float = None):
+        """Async `get_or_compute()`: `compute` is a coroutine function."""
+        found = self._lookup(key, version)
+        if found is not None:
+            self.stats["hits"] += 1
+            return found[0]
+
+        # event-loop only, so no guard is needed around the lock table
+        entry = self._async_locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                found = self._lookup(key, version)
+                if found is not None:
+                    self.stats["coalesced"] += 1
+                    return found[0]
+                self.stats["misses"] += 1
+                value = await compute()
+                self._set(key, version, value, ttl)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._async_locks[key]
+        return value
+
+    def clear(self):
+        if self.shared:
+            self.store.clear()
+            return
+        with self._store_lock:
+            self.store.clear()
+
+    def cached(self, fetch_version, ttl: float = None):
+        """
+        Decorator for FastAPI handlers taking a `db` session: the result is
+        cached per handler and query params (everything except `db`).
+        For coroutine handlers `fetch_version` must be a coroutine function.
+        """
+        def decorator(fn):
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(**kwargs):
+                    db = kwargs["db"]
+                    params = tuple(sorted((k, v) for k, v in kwargs.items() if k != "db"))
+                    key = (fn.__name__, params)
+                    version = await self.aversion(lambda: fetch_version(db))
+                    return await self.aget_or_compute(key, version, lambda: fn(**kwargs), ttl)
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(**kwargs):
+                db = kwargs["db"]
+                params = tuple(sorted((k, v) for k, v in kwargs.items() if k != "db"))
+                key = (fn.__name__, params)
+                version = self.version(lambda: fetch_version(db))
+                return self.get_or_compute(key, version, lambda: fn(**kwargs), ttl)
+            return wrapper
+        return decorator
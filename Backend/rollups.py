@@ -0,0 +1,205 @@
+"""
+Per-day aggregates of the alerts table for the /stats endpoints.
+
+The consumer folds newly inserted alerts into the rollups in the same
+transaction as the insert (apply_rollups); running this module rebuilds
+them from the raw table, e.g. as a backfill or a nightly repair job:
+
+    python rollups.py            # rebuild everything
+    python rollups.py --days 7   # rebuild the last 7 days
+"""
+import argparse
+import os
+from datetime import datetime, timedelta
+
+import psycopg2
+from dotenv import load_dotenv
+
+
+ROLLUP_DDL = """
+CREATE TABLE IF NOT EXISTS alerts_daily (
+  day          date PRIMARY KEY,
+  alert_count  bigint NOT NULL,
+  score_sum    numeric NOT NULL,
+  score_count  bigint NOT NULL
+);
+CREATE TABLE IF NOT EXISTS alerts_daily_severity (
+  day           date,
+  severity_band text,
+  alert_count   bigint NOT NULL,
+  PRIMARY KEY (day, severity_band)
+);
+CREATE TABLE IF NOT EXISTS alerts_daily_activity (
+  day          date,
+  activity     text,
+  alert_count  bigint NOT NULL,
+  PRIMARY KEY (day, activity)
+);
+CREATE TABLE IF NOT EXISTS alerts_daily_entity (
+  day          date,
+  entity       text,
+  alert_count  bigint NOT NULL,
+  PRIMARY KEY (day, entity)
+);
+CREATE TABLE IF NOT EXISTS alerts_entity_totals (
+  entity       text PRIMARY KEY,
+  alert_count  bigint NOT NULL
+);
+CREATE INDEX IF NOT EXISTS alerts_entity_totals_count_idx
+  ON alerts_entity_totals (alert_count DESC);
+CREATE TABLE IF NOT EXISTS alerts_ingest (
+  id   smallint PRIMARY KEY CHECK (id = 1),
+  seq  bigint NOT NULL
+);
+INSERT INTO alerts_ingest (id, seq) VALUES (1, 0) ON CONFLICT (id) DO NOTHING;
+"""
+
+# Day each table is bucketed by (matching what its endpoint filters on)
+PUBLISHED_DAY = "(published_at AT TIME ZONE 'UTC')::date"
+FETCHED_DAY = "(fetched_at AT TIME ZONE 'UTC')::date"
+ENTITY_DAY = "(COALESCE(published_at, fetched_at) AT TIME ZONE 'UTC')::date"
+
+# Each statement aggregates the alerts matching {where} and adds the
+# result onto the rollup rows
+ROLLUP_SQL = [
+    ("alerts_daily", PUBLISHED_DAY, f"""
+INSERT INTO alerts_daily (day, alert_count, score_sum, score_count)
+SELECT {PUBLISHED_DAY}, count(*),
+       COALESCE(sum(violence_score), 0), count(violence_score)
+FROM alerts
+WHERE published_at IS NOT NULL AND {{where}}
+GROUP BY 1
+ON CONFLICT (day) DO UPDATE SET
+  alert_count = alerts_daily.alert_count + EXCLUDED.alert_count,
+  score_sum   = alerts_daily.score_sum   + EXCLUDED.score_sum,
+  score_count = alerts_daily.score_count + EXCLUDED.score_count;
+"""),
+    ("alerts_daily_severity", FETCHED_DAY, f"""
+INSERT INTO alerts_daily_severity (day, severity_band, alert_count)
+SELECT {FETCHED_DAY}, COALESCE(severity_band, ''), count(*)
+FROM alerts
+WHERE fetched_at IS NOT NULL AND {{where}}
+GROUP BY 1, 2
+ON CONFLICT (day, severity_band) DO UPDATE SET
+  alert_count = alerts_daily_severity.alert_count + EXCLUDED.alert_count;
+"""),
+    ("alerts_daily_activity", PUBLISHED_DAY, f"""
+INSERT INTO alerts_daily_activity (day, activity, alert_count)
+SELECT {PUBLISHED_DAY}, activity, count(*)
+FROM alerts, jsonb_array_elements_text(to_jsonb(activities)) AS activity
+WHERE published_at IS NOT NULL AND {{where}}
+GROUP BY 1, 2
+ON CONFLICT (day, activity) DO UPDATE SET
+  alert_count = alerts_daily_activity.alert_count + EXCLUDED.alert_count;
+"""),
+    ("alerts_daily_entity", ENTITY_DAY, f"""
+INSERT INTO alerts_daily_entity (day, entity, alert_count)
+SELECT {ENTITY_DAY}, elem->>'text', count(*)
+FROM alerts, jsonb_array_elements(entities) AS elem
+WHERE elem->>'text' IS NOT NULL
+  AND COALESCE(published_at, fetched_at) IS NOT NULL AND {{where}}
+GROUP BY 1, 2
+ON CONFLICT (day, entity) DO UPDATE SET
+  alert_count = alerts_daily_entity.alert_count + EXCLUDED.alert_count;
+"""),
+]
+
+
+# All-time entity counts for /stats/top_entities, so its cost doesn't grow
+# with the number of days stored
+ENTITY_TOTALS_SQL = """
+INSERT INTO alerts_entity_totals (entity, alert_count)
+SELECT elem->>'text', count(*)
+FROM alerts, jsonb_array_elements(entities) AS elem
+WHERE elem->>'text' IS NOT NULL
+  AND COALESCE(published_at, fetched_at) IS NOT NULL AND id = ANY(%(ids)s)
+GROUP BY 1
+ON CONFLICT (entity) DO UPDATE SET
+  alert_count = alerts_entity_totals.alert_count + EXCLUDED.alert_count;
+"""
+
+ENTITY_TOTALS_REBUILD_SQL = """
+DELETE FROM alerts_entity_totals;
+INSERT INTO alerts_entity_totals (entity, alert_count)
+SELECT entity, sum(alert_count)
+FROM alerts_daily_entity
+GROUP BY entity;
+"""
+
+
+# One-row counter bumped whenever the rollups change; alerts_service puts it
+# in its data version, so late-arriving alerts invalidate cached responses
+BUMP_INGEST_SQL = "UPDATE alerts_ingest SET seq = seq + 1 WHERE id = 1;"
+
+
+# Seed the totals from existing daily rows the first time the table appears
+ENTITY_TOTALS_SEED_SQL = """
+INSERT INTO alerts_entity_totals (entity, alert_count)
+SELECT entity, sum(alert_count)
+FROM alerts_daily_entity
+WHERE NOT EXISTS (SELECT 1 FROM alerts_entity_totals)
+GROUP BY entity;
+"""
+
+
+def ensure_rollup_schema(cur):
+    """Create the rollup tables if they don't exist."""
+    cur.execute(ROLLUP_DDL)
+    cur.execute(ENTITY_TOTALS_SEED_SQL)
+
+
+def apply_rollups(cur, ids):
+    """
+    Add the alerts with these ids to the rollups. Call in the same
+    transaction as the insert, with only the ids that were actually
+    inserted, so each alert is counted exactly once.
+    """
+    if not ids:
+        return
+    for _, _, sql in ROLLUP_SQL:
+        cur.execute(sql.format(where="id = ANY(%(ids)s)"), {"ids": list(ids)})
+    cur.execute(ENTITY_TOTALS_SQL, {"ids": list(ids)})
+    cur.execute(BUMP_INGEST_SQL)
+
+
+def rebuild_rollups(cur, days=None):
+    """
+    Recompute the rollups from the alerts table, either entirely or for
+    the last `days` days only.
+    """
+    if days is None:
+        since = None
+    else:
+        since = (datetime.utcnow() - timedelta(days=days)).date()
+
+    for table, day_expr, sql in ROLLUP_SQL:
+        if since is None:
+            cur.execute(f"DELETE FROM {table}")
+            cur.execute(sql.format(where="TRUE"))
+        else:
+            cur.execute(f"DELETE FROM {table} WHERE day >= %(since)s",
+                        {"since": since})
+            cur.execute(sql.format(where=f"{day_expr} >= %(since)s"),
+                        {"since": since})
+    # totals have no day column; re-sum them from the rebuilt daily rows
+    cur.execute(ENTITY_TOTALS_REBUILD_SQL)
+    cur.execute(BUMP_INGEST_SQL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=int, default=None,
+                        help="only rebuild the last N days")
+    args = parser.parse_args()
+
+    load_dotenv()
+    conn = psycopg2.connect(os.getenv("PG_DSN"))
+    with conn, conn.cursor() as cur:
+        ensure_rollup_schema(cur)
+        rebuild_rollups(cur, args.days)
+    conn.close()
+    print("✅  Rollups rebuilt.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# sharding.py
+"""
+Split the RSS feed list across several producer instances.
+
+- StaticShard: instance index/count from config; feeds are placed with
+  rendezvous (highest-random-weight) hashing, so changing the count only
+  moves the feeds of the instances that were added or removed.
+- KafkaGroupShard: instances join a Kafka consumer group on a small
+  coordination topic; each feed hashes to one of the topic's partitions
+  and is owned by whichever instance the group assigned that partition
+  to. Kafka rebalances automatically as instances join or leave.
+"""
+import hashlib
+import time
+
+from confluent_kafka import Consumer
+
+
+def _hash(*parts) -> int:
+    digest = hashlib.blake2b("\x1f".join(map(str, parts)).encode("utf-8"),
+                             digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class AllFeeds:
+    """No sharding: this instance owns every feed."""
+
+    def select(self, urls: list) -> list:
+        return list(urls)
+
+    def close(self) -> None:
+        pass
+
+
+class StaticShard:
+
+    def __init__(self, index: int, count: int):
+        if not 0 <= index < count:
+            raise ValueError(f"PRODUCER_INSTANCE must be in [0, {count})")
+        self.index = index
+        self.count = count
+
+    def owner(self, url: str) -> int:
+        return max(range(self.count), key=lambda i: _hash(url, i))
+
+    def select(self, urls: list) -> list:
+        return [u for u in urls if self.owner(u) == self.index]
+
+    def close(self) -> None:
+        pass
+
+
+class KafkaGroupShard:
+
+    def __init__(self, cfg: dict):
+        self.topic = cfg["shard_topic"]
+        self.consumer = Consumer({
+            "bootstrap.servers": cfg["bootstrap_servers"],
+            "security.protocol": "SASL_SSL",
+            "sasl.mechanisms":   "PLAIN",
+            "sasl.username":     cfg["api_key"],
+            "sasl.password":     cfg["api_secret"],
+            "group.id":          cfg["shard_group"],
+            "enable.auto.commit": False,
+            # a poll cycle (fetch + classify + sleep) must fit in here
+            "max.poll.interval.ms": 900000,
+        })
+        meta = self.consumer.list_topics(self.topic, timeout=10)
+        self.buckets = len(meta.topics[self.topic].partitions)
+        if not self.buckets:
+            raise RuntimeError(f"Shard topic {self.topic!r} has no partitions")
+        self.consumer.subscribe([self.topic])
+
+        # give the initial group join a moment before the first cycle
+        deadline = time.monotonic() + 15
+        while not self.consumer.assignment() and time.monotonic() < deadline:
+            self.consumer.poll(0.5)
+
+    def owned_buckets(self) -> set:
+        # serve group membership / rebalance callbacks; no messages expected
+        self.consumer.poll(0)
+        return {tp.partition for tp in self.consumer.assignment()}
+
+    def select(self, urls: list) -> list:
+        owned = self.owned_buckets()
+        return [u for u in urls if _hash(u) % self.buckets in owned]
+
+    def close(self) -> None:
+        self.consumer.close()
+
+
+def make_shard(cfg: dict):
+    """Build the feed assigner selected by cfg["shard_mode"]."""
+    mode = cfg["shard_mode"]
+    if mode == "none":
+        return AllFeeds()
+    if mode == "static":
+        return StaticShard(cfg["shard_index"], cfg["shard_count"])
+    if mode == "kafka":
+        return KafkaGroupShard(cfg)
+    raise ValueError(f"Unknown SHARD_MODE: {mode!r}")
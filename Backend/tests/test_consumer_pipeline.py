@@ -0,0 +1,89 @@
+import queue
+import threading
+import time
+
+from consumer_pipeline import BatchStage, OffsetTracker, Stage
+
+
+def test_commits_only_the_contiguous_done_prefix():
+    tracker = OffsetTracker()
+    for offset in (10, 11, 12, 13):
+        tracker.add("t", 0, offset)
+
+    tracker.done("t", 0, 12)
+    tracker.done("t", 0, 13)
+    assert tracker.committable() == {}        # 10 and 11 still in flight
+
+    tracker.done("t", 0, 10)
+    assert tracker.committable() == {("t", 0): 11}
+    assert tracker.committable() == {}        # nothing new
+
+    tracker.done("t", 0, 11)
+    assert tracker.committable() == {("t", 0): 14}
+    assert tracker.in_flight() == 0
+
+
+def test_partitions_are_tracked_independently():
+    tracker = OffsetTracker()
+    tracker.add("t", 0, 5)
+    tracker.add("t", 1, 7)
+    tracker.add("t", 1, 8)
+    tracker.done("t", 1, 8)
+    tracker.done("t", 0, 5)
+    assert tracker.committable() == {("t", 0): 6}
+
+
+def test_forget_drops_revoked_partitions():
+    tracker = OffsetTracker()
+    tracker.add("t", 0, 1)
+    tracker.add("t", 1, 1)
+    tracker.forget([("t", 0)])
+    tracker.done("t", 0, 1)                   # late result for a revoked partition
+    tracker.done("t", 1, 1)
+    assert tracker.committable() == {("t", 1): 2}
+    assert tracker.in_flight() == 0
+
+
+def run_stage(stage, items, wait=1.0):
+    stop = threading.Event()
+    stage.start(stop)
+    for item in items:
+        stage.inq.put(item)
+    time.sleep(wait)
+    stop.set()
+    stage.join()
+    return sorted(stage.outq.queue)
+
+
+def test_batch_failure_retries_items_alone_then_falls_back():
+    def fn(items):
+        if len(items) > 1:
+            raise RuntimeError("batch failed")
+        if items[0] == 3:
+            raise RuntimeError("poison")
+        return [i * 10 for i in items]
+
+    stage = BatchStage("t", fn, queue.Queue(), queue.Queue(), batch_size=5,
+                       max_wait=0.1, fallback=lambda i: -i)
+    assert run_stage(stage, range(5)) == [-3, 0, 10, 20, 40]
+
+
+def test_failure_without_fallback_goes_to_on_error():
+    errors = []
+
+    def fn(item):
+        raise RuntimeError("undecodable")
+
+    stage = Stage("t", fn, queue.Queue(), queue.Queue(), on_error=errors.append)
+    assert run_stage(stage, [1, 2], wait=0.7) == []
+    assert sorted(errors) == [1, 2]
+
+
+def test_failure_without_handlers_keeps_item_out_of_outq():
+    def fn(items):
+        raise RuntimeError("db down")
+
+    stage = BatchStage("t", fn, queue.Queue(), queue.Queue(), batch_size=2,
+                       max_wait=0.1)
+    assert run_stage(stage, [1, 2], wait=0.7) == []
+    assert not stage.alive()
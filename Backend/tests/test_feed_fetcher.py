@@ -0,0 +1,79 @@
+import gzip
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("feedparser")
+
+from feed_fetcher import fetch_all, fetch_feed
+
+ETAG = '"v1"'
+FEED = """<?xml version="1.0"?>
+<rss version="2.0"><channel><title>Stub feed</title>
+<item><guid>a-1</guid><title>Caf\xe9 attack</title></item>
+</channel></rss>""".encode("iso-8859-1")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/slow":
+            time.sleep(2)
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = FEED
+        self.send_response(200)
+        self.send_header("Content-Type", "application/rss+xml; charset=iso-8859-1")
+        self.send_header("ETag", ETAG)
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the timeout test hangs up before the reply
+
+
+@pytest.fixture(scope="module")
+def base_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def test_200_parses_gzip_body(base_url):
+    feed, validators = fetch_feed(f"{base_url}/feed", {}, timeout=5)
+    assert feed.feed.title == "Stub feed"
+    assert feed.entries[0].title == "Caf\xe9 attack"
+    assert validators["etag"] == ETAG
+
+
+def test_304_returns_no_feed_and_keeps_validators(base_url):
+    feed, validators = fetch_feed(f"{base_url}/feed", {"etag": ETAG}, timeout=5)
+    assert feed is None
+    assert validators == {"etag": ETAG}
+
+
+def test_timeout_raises(base_url):
+    with pytest.raises((socket.timeout, OSError)):
+        fetch_feed(f"{base_url}/slow", {}, timeout=0.2)
+
+
+def test_fetch_all_leaves_state_to_the_caller(base_url):
+    state = {}
+    urls = [f"{base_url}/feed", f"{base_url}/slow"]
+    changed, validators = fetch_all(urls, state, timeout=0.2, max_workers=2)
+    assert [url for url, _ in changed] == [f"{base_url}/feed"]
+    assert validators == {f"{base_url}/feed": {"etag": ETAG, "modified": None}}
+    assert state == {}
@@ -0,0 +1,90 @@
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+for module in ("confluent_kafka", "dotenv", "spacy", "geopy", "bs4"):
+    pytest.importorskip(module)
+
+import news_consumer
+from news_consumer import write_batch
+
+
+class FakeConn:
+    def __init__(self, name):
+        self.name = name
+        self.commits = 0
+        self.rollbacks = 0
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class FakeCursor:
+    """Rejects the batch insert; row inserts fail as scripted per id."""
+
+    def __init__(self, written, failures):
+        self.written = written
+        self.failures = failures
+        self.last = None
+
+    def execute(self, sql, params):
+        error = self.failures.get(params["id"])
+        if error:
+            self.failures[params["id"]] = error[1:]
+            if error[0]:
+                raise error[0]
+        self.written.append(params["id"])
+        self.last = params["id"]
+
+    def fetchone(self):
+        return (self.last,)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    written, failures, reconnects = [], {}, []
+
+    def reject_batch(*args, **kwargs):
+        raise psycopg2.ProgrammingError("batch rejected")
+
+    def reconnect(dsn):
+        reconnects.append(dsn)
+        return FakeConn("fresh"), FakeCursor(written, failures)
+
+    monkeypatch.setattr(news_consumer, "execute_values", reject_batch)
+    monkeypatch.setattr(news_consumer, "apply_rollups", lambda cur, ids: None)
+    monkeypatch.setattr(news_consumer, "reconnect_db", reconnect)
+    return written, failures, reconnects
+
+
+def rows(*ids):
+    return [{"id": i} for i in ids]
+
+
+def test_row_retried_after_lost_connection(db):
+    written, failures, reconnects = db
+    failures["b"] = [psycopg2.OperationalError("server closed the connection")]
+    conn, cur = write_batch(FakeConn("old"), FakeCursor(written, failures),
+                            "dsn", rows("a", "b", "c"))
+    assert written == ["a", "b", "c"]
+    assert reconnects == ["dsn"]
+    assert conn.name == "fresh"
+
+
+def test_poison_row_is_skipped(db):
+    written, failures, _ = db
+    failures["b"] = [psycopg2.DataError("invalid timestamp")]
+    write_batch(FakeConn("old"), FakeCursor(written, failures), "dsn",
+                rows("a", "b", "c"))
+    assert written == ["a", "c"]
+
+
+def test_other_row_failures_raise(db):
+    written, failures, _ = db
+    failures["b"] = [psycopg2.ProgrammingError("column does not exist")]
+    with pytest.raises(psycopg2.ProgrammingError):
+        write_batch(FakeConn("old"), FakeCursor(written, failures), "dsn",
+                    rows("a", "b", "c"))
+    assert written == ["a"]
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+for module in ("confluent_kafka", "dotenv", "transformers", "torch"):
+    pytest.importorskip(module)
+
+from news_producer import DeliveryTracker, WireStats
+
+
+class FakeMsg:
+    def __init__(self, key, value=b"{}"):
+        self._key = key
+        self._value = value
+
+    def key(self):
+        return self._key
+
+    def value(self):
+        return self._value
+
+    def topic(self):
+        return "news"
+
+    def headers(self):
+        return []
+
+    def latency(self):
+        return 0.01
+
+
+def test_delivered_story_is_seen():
+    seen = set()
+    tracker = DeliveryTracker(max_redeliveries=1, seen_ids=seen)
+    tracker.track(b"a", "https://feed/1")
+
+    tracker(None, FakeMsg(b"a", b"12345"))
+
+    assert seen == {"a"}
+    assert not tracker.pending
+    assert tracker.take_dropped_feeds() == set()
+    assert tracker.reset_stats()["value_bytes"] == 5
+
+
+def test_dropped_story_reports_its_feed():
+    seen = set()
+    tracker = DeliveryTracker(max_redeliveries=1, seen_ids=seen)
+    tracker.track(b"a", "https://feed/1")
+
+    tracker("timeout", FakeMsg(b"a"))   # redelivered once
+    assert len(tracker.failed) == 1
+    tracker("timeout", FakeMsg(b"a"))   # then given up on
+
+    assert seen == set()
+    assert not tracker.pending
+    assert tracker.take_dropped_feeds() == {"https://feed/1"}
+    assert tracker.take_dropped_feeds() == set()
+
+
+def test_wire_stats_reports_per_cycle_txbytes():
+    wire = WireStats()
+    assert wire.reset_stats() is None
+
+    wire(json.dumps({"txbytes": 1000}))
+    assert wire.reset_stats() == 1000
+    wire(json.dumps({"txbytes": 1500}))
+    assert wire.reset_stats() == 500
+    assert wire.reset_stats() == 0
@@ -0,0 +1,32 @@
+import pytest
+
+spacy = pytest.importorskip("spacy")
+
+import nlp_factory
+
+
+@pytest.fixture
+def blank_model(monkeypatch):
+    """Stand in for the en_core_web_* packages with a blank pipeline."""
+    load = spacy.load
+
+    def fake_load(name, *args, **kwargs):
+        if str(name).startswith("en_core_web_"):
+            nlp = spacy.blank("en")
+            nlp.add_pipe("ner")
+            return nlp
+        return load(name, *args, **kwargs)
+
+    monkeypatch.setattr(nlp_factory.spacy, "load", fake_load)
+
+
+def test_cached_pipeline_is_renamed_into_place(tmp_path, blank_model):
+    nlp = nlp_factory.build_pipeline("sm", cache_dir=tmp_path)
+
+    saved = list(tmp_path.iterdir())
+    assert len(saved) == 1
+    assert saved[0].name.startswith("en_core_web_sm-")
+    assert ".tmp-" not in saved[0].name
+
+    reloaded = nlp_factory.build_pipeline("sm", cache_dir=tmp_path)
+    assert reloaded.pipe_names == nlp.pipe_names == ["entity_ruler", "ner"]
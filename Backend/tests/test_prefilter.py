@@ -0,0 +1,49 @@
+import pytest
+
+from prefilter import LexiconPrefilter
+
+
+@pytest.fixture
+def prefilter():
+    return LexiconPrefilter(target_recall=0.9, audit_rate=0.0,
+                            min_audits=10, window=100)
+
+
+@pytest.mark.parametrize("text", [
+    "Warm weather expected", "Storm warning issued", "New diet craze",
+    "Shellfish prices rise", "Software update shipped",
+])
+def test_no_prefix_matches(prefilter, text):
+    assert not prefilter.is_candidate(text)
+
+
+@pytest.mark.parametrize("text", [
+    "Wars rage on", "Three killed in blast", "Gunmen open fire",
+    "Rebels clashed overnight", "Shelling resumes", "AK-47 seized",
+])
+def test_inflections_match(prefilter, text):
+    assert prefilter.is_candidate(text)
+
+
+def entries(n):
+    return [{"uid": str(i), "snippet": "quiet news"} for i in range(n)]
+
+
+def test_stays_tripped_across_windows_until_recovery(prefilter):
+    # low recall: half of the audited rejects turn out violent
+    prefilter.split(entries(20))
+    prefilter.record(forwarded_violent=10, audited=20, audited_violent=10)
+    assert prefilter.tripped
+
+    # many windows of rejections without new audit results
+    for _ in range(10):
+        forward, audit, skipped = prefilter.split(entries(50))
+        assert not skipped
+    assert prefilter.tripped
+
+    # audits show the rejected stream is clean again
+    for _ in range(10):
+        prefilter.split(entries(50))
+        prefilter.record(forwarded_violent=10, audited=50, audited_violent=0)
+    assert not prefilter.tripped
+    assert prefilter.estimated_recall() >= 0.9
@@ -0,0 +1,140 @@
+"""
+Score parity between ZeroShotClassifier and the transformers zero-shot
+pipeline it replaces. A tiny random BART built in a temp dir always runs;
+the real model (ZS_TEST_MODEL, default bart-large-mnli) is used when it is
+available locally and skipped otherwise.
+"""
+import os
+
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+tokenizers = pytest.importorskip("tokenizers")
+
+from zero_shot import DEFAULT_MODEL, ZeroShotClassifier
+
+HEADLINES = [
+    "Gunmen kill 12 in attack on village market",
+    "Central bank holds interest rates steady",
+    "Protesters clash with police outside parliament",
+    "Local bakery wins national bread award",
+    "Car bomb explodes near checkpoint, wounding several soldiers",
+    # longer than the tiny model's max length, to exercise truncation
+    "School reopens after flood repairs are completed " * 12,
+]
+SINGLE_LABELS = ["violent", "non-violent"]
+MULTI_LABELS = ["protest", "armed conflict", "economy", "education"]
+TOLERANCE = 1e-4
+
+
+def build_tiny_model(path):
+    from tokenizers import decoders, models, pre_tokenizers, processors, trainers
+    from transformers import (BartConfig, BartForSequenceClassification,
+                              PreTrainedTokenizerFast)
+
+    tok = tokenizers.Tokenizer(models.BPE(unk_token="<unk>"))
+    tok.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tok.decoder = decoders.ByteLevel()
+    tok.train_from_iterator(HEADLINES, trainers.BpeTrainer(
+        vocab_size=400, special_tokens=["<s>", "<pad>", "</s>", "<unk>"],
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet()))
+    tok.post_processor = processors.RobertaProcessing(("</s>", 2), ("<s>", 0))
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=tok, bos_token="<s>", eos_token="</s>",
+        sep_token="</s>", cls_token="<s>", pad_token="<pad>",
+        unk_token="<unk>", model_max_length=48,
+        model_input_names=["input_ids", "attention_mask"])
+
+    config = BartConfig(
+        vocab_size=len(tokenizer), d_model=16, encoder_layers=1,
+        decoder_layers=1, encoder_attention_heads=2, decoder_attention_heads=2,
+        encoder_ffn_dim=32, decoder_ffn_dim=32, max_position_embeddings=64,
+        pad_token_id=1, bos_token_id=0, eos_token_id=2, num_labels=3,
+        id2label={0: "contradiction", 1: "neutral", 2: "entailment"},
+        label2id={"contradiction": 0, "neutral": 1, "entailment": 2})
+    torch.manual_seed(0)
+    model = BartForSequenceClassification(config)
+    with torch.no_grad():
+        # spread the logits so the comparison isn't between near-uniform scores
+        model.classification_head.out_proj.weight.mul_(50)
+    model.save_pretrained(path)
+    tokenizer.save_pretrained(path)
+    return str(path)
+
+
+@pytest.fixture(scope="module", params=["tiny", "real"])
+def model_name(request, tmp_path_factory):
+    if request.param == "tiny":
+        return build_tiny_model(tmp_path_factory.mktemp("tiny-bart"))
+    name = os.getenv("ZS_TEST_MODEL", DEFAULT_MODEL)
+    try:
+        transformers.AutoConfig.from_pretrained(name, local_files_only=True)
+    except OSError:
+        pytest.skip(f"{name} is not available locally")
+    return name
+
+
+@pytest.fixture(scope="module")
+def reference(model_name):
+    return transformers.pipeline("zero-shot-classification", model=model_name,
+                                 device=-1)
+
+
+def as_dicts(results):
+    return [dict(zip(r["labels"], r["scores"])) for r in results]
+
+
+def max_drift(ours, theirs, labels):
+    return max(abs(o[lbl] - t[lbl])
+               for o, t in zip(as_dicts(ours), as_dicts(theirs)) for lbl in labels)
+
+
+@pytest.mark.parametrize("labels,multi_label", [
+    (SINGLE_LABELS, False),
+    (MULTI_LABELS, False),
+    (MULTI_LABELS, True),
+])
+def test_scores_match_pipeline(model_name, reference, labels, multi_label):
+    clf = ZeroShotClassifier(model_name)
+    ours = clf(HEADLINES, labels, multi_label=multi_label, batch_size=4)
+    theirs = reference(HEADLINES, labels, multi_label=multi_label)
+    assert [r["sequence"] for r in ours] == HEADLINES
+    assert max_drift(ours, theirs, labels) <= TOLERANCE
+
+
+def test_single_sequence_returns_one_result(model_name, reference):
+    clf = ZeroShotClassifier(model_name)
+    ours = clf(HEADLINES[0], SINGLE_LABELS)
+    theirs = reference(HEADLINES[0], SINGLE_LABELS)
+    assert ours["labels"] == theirs["labels"]
+    assert max_drift([ours], [theirs], SINGLE_LABELS) <= TOLERANCE
+
+
+# Quantized/exported backends may drift a little from FP32, but not enough
+# to move an alert across a severity band
+BACKEND_TOLERANCE = 0.05
+
+
+@pytest.mark.parametrize("backend", ["int8", "onnx"])
+def test_backend_drift_against_fp32_pipeline(model_name, reference, backend,
+                                             tmp_path_factory, monkeypatch):
+    if backend == "onnx":
+        pytest.importorskip("optimum.onnxruntime")
+        monkeypatch.setenv("ZS_ONNX_DIR", str(tmp_path_factory.mktemp("onnx")))
+    clf = ZeroShotClassifier(model_name, backend=backend)
+    ours = clf(HEADLINES, SINGLE_LABELS)
+    theirs = reference(HEADLINES, SINGLE_LABELS)
+    assert max_drift(ours, theirs, SINGLE_LABELS) <= BACKEND_TOLERANCE
+
+
+def test_onnx_export_is_reused(model_name, tmp_path, monkeypatch):
+    pytest.importorskip("optimum.onnxruntime")
+    import zero_shot
+
+    monkeypatch.setenv("ZS_ONNX_DIR", str(tmp_path))
+    zero_shot.load_onnx_model(model_name)
+    exported = zero_shot.onnx_export_dir(model_name)
+    stamp = exported.stat().st_mtime_ns
+    zero_shot.load_onnx_model(model_name)
+    assert exported.stat().st_mtime_ns == stamp
@@ -1,18 +1,106 @@
+import asyncio
+import os
+from typing import List
+
 from fastapi import FastAPI
 from pydantic import BaseModel
-from transformers import pipeline
 
-app = FastAPI(title="Tone Inference Service")
+from zero_shot import get_classifier
 
-# Load model once at startup
-classifier = pipeline("zero-shot-classification", model="facebook/bart-large-mnli")
+app = FastAPI(title="Tone Inference Service")
 
 LABELS = ["Negative", "Passive-Aggressive", "Sarcastic", "Positive", "Neutral", "Offensive"]
 
+# Load model once at startup (shared with any other zero-shot user in-process)
+classifier = get_classifier()
+classifier.prepare(LABELS)
+
+# Micro-batching: wait up to MAX_WAIT_MS for up to MAX_BATCH concurrent texts
+MAX_BATCH = int(os.getenv("TONE_MAX_BATCH", "16"))
+MAX_WAIT_MS = float(os.getenv("TONE_MAX_WAIT_MS", "5"))
+
+
+def classify(texts: List[str]) -> list:
+    return classifier(texts, LABELS, multi_label=True, batch_size=MAX_BATCH)
+
+
+class MicroBatcher:
+    """
+    Gathers texts submitted by concurrent requests and runs them through
+    the model as one forward pass, handing each caller its own result.
+    A single runner owns the model, so passes never overlap.
+    """
+
+    def __init__(self, fn, max_batch: int, max_wait: float):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = None
+        self.task = None
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    async def submit(self, text: str):
+        fut = asyncio.get_running_loop().create_future()
+        await self.queue.put((text, fut))
+        return await fut
+
+    async def _collect(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            try:
+                results = await asyncio.to_thread(self.fn, [t for t, _ in batch])
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            for (_, fut), result in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(result)
+
+
+batcher = MicroBatcher(classify, MAX_BATCH, MAX_WAIT_MS / 1000.0)
+
+
 class TextInput(BaseModel):
     text: str
 
+class TextBatch(BaseModel):
+    texts: List[str]
+
+@app.on_event("startup")
+async def on_startup():
+    batcher.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await batcher.stop()
+
 @app.post("/infer")
-def infer_tone(input: TextInput):
-    result = classifier(input.text, LABELS, multi_label=True)
-    return result
+async def infer_tone(input: TextInput):
+    return await batcher.submit(input.text)
+
+@app.post("/infer/batch")
+async def infer_tone_batch(input: TextBatch):
+    return await asyncio.gather(*(batcher.submit(t) for t in input.texts))
@@ -0,0 +1,158 @@
+"""
+Backfill alerts.tone: pick up freshly ingested alerts that have no tone
+yet, score them through the tone service and store the result, so the
+alert detail endpoint never has to wait on the classifier.
+
+Failed attempts are counted per alert; a failing alert is retried after a
+growing delay and given up on after TONE_MAX_ATTEMPTS, so a few poison
+rows can't keep the worker from reaching the rest of the backlog.
+"""
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+
+import httpx
+import psycopg2
+from dotenv import load_dotenv
+from psycopg2 import InterfaceError, OperationalError
+
+
+SQL_PENDING = """
+SELECT id, title, summary
+FROM alerts
+WHERE tone IS NULL
+  AND tone_attempts < %(max_attempts)s
+  AND (tone_failed_at IS NULL
+       OR tone_failed_at < now() - make_interval(secs => %(retry_delay)s * tone_attempts))
+ORDER BY fetched_at DESC
+LIMIT %(limit)s;
+"""
+
+SQL_SET_TONE = """
+UPDATE alerts SET tone = %(tone)s::jsonb WHERE id = %(id)s;
+"""
+
+SQL_TONE_FAILED = """
+UPDATE alerts
+SET tone_attempts = tone_attempts + 1, tone_failed_at = now()
+WHERE id = ANY(%(ids)s);
+"""
+
+
+def reconnect_db(dsn):
+    """Open a fresh DB connection (retrying until it succeeds)."""
+    while True:
+        try:
+            conn = psycopg2.connect(dsn)
+            print("✅  Connected to database.")
+            return conn
+        except Exception as e:
+            print(f"❌  DB connect failed: {e!r}, retrying in 5s…")
+            time.sleep(5)
+
+
+class Connection:
+    """One psycopg2 connection that is reopened when the server drops it."""
+
+    def __init__(self, dsn):
+        self.dsn = dsn
+        self.conn = reconnect_db(dsn)
+
+    def call(self, fn, *args):
+        # both queries are idempotent, so rerunning one on a new connection is safe
+        while True:
+            try:
+                return fn(self.conn, *args)
+            except (OperationalError, InterfaceError) as e:
+                print(f"⚠️  DB connection lost: {e!r}, reconnecting…")
+                self.close()
+                self.conn = reconnect_db(self.dsn)
+
+    def close(self):
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+
+def fetch_pending(conn, limit, max_attempts, retry_delay):
+    with conn.cursor() as cur:
+        cur.execute(SQL_PENDING, {"limit": limit,
+                                  "max_attempts": max_attempts,
+                                  "retry_delay": retry_delay})
+        rows = cur.fetchall()
+    conn.commit()
+    return rows
+
+
+def store_tones(conn, results, failed_ids):
+    with conn.cursor() as cur:
+        for alert_id, tone in results:
+            cur.execute(SQL_SET_TONE, {"id": alert_id, "tone": json.dumps(tone)})
+        if failed_ids:
+            cur.execute(SQL_TONE_FAILED, {"ids": failed_ids})
+    conn.commit()
+
+
+async def infer_one(client, url, sem, row):
+    alert_id, title, summary = row
+    async with sem:
+        try:
+            response = await client.post(url, json={"text": f"{title} {summary}"})
+            response.raise_for_status()
+            return alert_id, response.json()
+        except Exception as e:
+            print(f"⚠️  Tone failed for {alert_id}: {e!r}")
+            return alert_id, None
+
+
+async def run(db, url, batch_size, concurrency, poll_interval,
+              max_attempts, retry_delay):
+    sem = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency,
+                          max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=30, limits=limits) as client:
+        while True:
+            rows = await asyncio.to_thread(db.call, fetch_pending, batch_size,
+                                           max_attempts, retry_delay)
+            if not rows:
+                await asyncio.sleep(poll_interval)
+                continue
+
+            results = await asyncio.gather(
+                *(infer_one(client, url, sem, row) for row in rows)
+            )
+            done = [(i, tone) for i, tone in results if tone]
+            failed = [i for i, tone in results if not tone]
+            await asyncio.to_thread(db.call, store_tones, done, failed)
+            print(f"[{datetime.utcnow():%Y-%m-%d %H:%M:%S}] "
+                  f"✅  Stored tone for {len(done)}/{len(rows)} alerts")
+
+            if len(done) < len(rows):
+                # tone service is struggling; back off before retrying
+                await asyncio.sleep(poll_interval)
+
+
+def main():
+    load_dotenv()
+    db = Connection(os.getenv("PG_DSN"))
+    url = os.getenv("TONE_SERVICE_URL", "http://localhost:8002/infer")
+    try:
+        asyncio.run(run(
+            db, url,
+            batch_size=int(os.getenv("TONE_BATCH_SIZE", "32")),
+            concurrency=int(os.getenv("TONE_CONCURRENCY", "4")),
+            poll_interval=float(os.getenv("TONE_POLL_INTERVAL", "10")),
+            max_attempts=int(os.getenv("TONE_MAX_ATTEMPTS", "5")),
+            retry_delay=float(os.getenv("TONE_RETRY_SECONDS", "300")),
+        ))
+    except KeyboardInterrupt:
+        print("🛑  Shutting down…")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
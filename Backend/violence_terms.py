@@ -0,0 +1,23 @@
+# violence_terms.py
+"""
+Violence lexicon shared by the spaCy EntityRuler (nlp_factory) and the
+producer's cheap prefilter (prefilter).
+"""
+from pathlib import Path
+
+WEAPON_TERMS_PATH = Path(__file__).with_name("weapon_terms.txt")
+
+VIOLENT_ACT_TERMS = [
+    "shooting", "bombing", "stabbed", "hijack", "attack", "assassination",
+    "explosion", "arson", "beating", "torture", "kidnapping", "massacre",
+]
+
+INJURY_TERMS = ["killed", "wounded", "injured", "casualties", "fatalities"]
+
+
+def weapon_terms():
+    return [
+        term.strip()
+        for term in WEAPON_TERMS_PATH.read_text().splitlines()
+        if term.strip()
+    ]
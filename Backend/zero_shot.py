@@ -0,0 +1,254 @@
+# zero_shot.py
+"""
+Process-wide registry of zero-shot NLI classifiers.
+
+Every caller (producer violence/activity tagging, tone service) shares one
+copy of the model weights per model name and backend, and tokenized
+hypotheses are cached per label set so they are only encoded once.
+
+Backends (ZS_BACKEND): "torch" (FP32), "int8" (dynamic int8 quantization of
+the Linear layers) or "onnx" (ONNX Runtime, needs optimum[onnxruntime]; the
+model is exported once into ZS_ONNX_DIR and loaded from there afterwards).
+Run this module to compare the backends' latency and memory; score drift
+against the transformers pipeline is asserted in tests/test_zero_shot.py.
+"""
+import os
+import resource
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+
+import torch
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+DEFAULT_MODEL = "facebook/bart-large-mnli"
+HYPOTHESIS_TEMPLATE = "This example is {}."
+BACKENDS = ("torch", "int8", "onnx")
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def onnx_export_dir(model_name: str) -> Path:
+    """Where the ONNX export of `model_name` is kept (under ZS_ONNX_DIR)."""
+    root = Path(os.getenv("ZS_ONNX_DIR", "onnx_models"))
+    return root / model_name.strip("/").replace("/", "--")
+
+
+def load_onnx_model(model_name: str):
+    """
+    Load the ONNX Runtime model for `model_name`, exporting it on first
+    use only: the export takes minutes and several GB of RAM for bart-large.
+    """
+    from optimum.onnxruntime import ORTModelForSequenceClassification
+
+    target = onnx_export_dir(model_name)
+    if not target.exists():
+        print(f"⏳  Exporting {model_name} to ONNX in {target} (one-off)…")
+        tmp = target.with_name(f"{target.name}.tmp-{os.getpid()}")
+        ORTModelForSequenceClassification.from_pretrained(
+            model_name, export=True
+        ).save_pretrained(tmp)
+        try:
+            tmp.replace(target)
+        except OSError:
+            # another process finished its export first; use that one
+            shutil.rmtree(tmp, ignore_errors=True)
+    return ORTModelForSequenceClassification.from_pretrained(target)
+
+
+def load_model(model_name: str, backend: str):
+    """
+    Load the NLI model for `backend`; every variant exposes `.config` and
+    returns `.logits` when called with tokenizer output.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown zero-shot backend: {backend!r}")
+
+    if backend == "onnx":
+        try:
+            return load_onnx_model(model_name)
+        except ImportError as e:
+            raise RuntimeError(
+                "ZS_BACKEND=onnx needs optimum[onnxruntime] installed"
+            ) from e
+
+    model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    model.eval()
+    if backend == "int8":
+        model = torch.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    return model
+
+
+class ZeroShotClassifier:
+    """
+    Drop-in replacement for the transformers zero-shot pipeline that
+    keeps the encoded hypotheses of each label set around between calls.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, backend: str = "torch"):
+        self.model_name = model_name
+        self.backend = backend
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = load_model(model_name, backend)
+
+        label2id = {k.lower(): v for k, v in self.model.config.label2id.items()}
+        self.entail_id = label2id.get("entailment", -1)
+        self.contra_id = label2id.get("contradiction", 0)
+        self.max_length = min(self.tokenizer.model_max_length, 1024)
+        self._prefix, self._middle, self._suffix = self._pair_layout()
+
+        self._hypotheses = {}
+        self._lock = threading.Lock()
+
+    def prepare(self, labels, template: str = HYPOTHESIS_TEMPLATE) -> list:
+        """
+        Return the token ids of each hypothesis for `labels`, encoding
+        them on first use only.
+        """
+        key = (tuple(labels), template)
+        with self._lock:
+            cached = self._hypotheses.get(key)
+            if cached is None:
+                cached = self.tokenizer(
+                    [template.format(lbl) for lbl in labels],
+                    add_special_tokens=False,
+                )["input_ids"]
+                self._hypotheses[key] = cached
+        return cached
+
+    def _pair_layout(self) -> tuple:
+        """
+        (prefix, middle, suffix) special token ids the tokenizer puts around
+        a (premise, hypothesis) pair, read off an encoded probe pair; not
+        every tokenizer class exposes build_inputs_with_special_tokens.
+        """
+        first = self.tokenizer("premise", add_special_tokens=False)["input_ids"]
+        second = self.tokenizer("hypothesis", add_special_tokens=False)["input_ids"]
+        full = self.tokenizer("premise", "hypothesis")["input_ids"]
+
+        def find(sub, start):
+            for i in range(start, len(full) - len(sub) + 1):
+                if full[i:i + len(sub)] == sub:
+                    return i
+            raise ValueError(f"Can't infer pair layout of {self.model_name}")
+
+        i = find(first, 0)
+        j = find(second, i + len(first))
+        return full[:i], full[i + len(first):j], full[j + len(second):]
+
+    def _pair_ids(self, premise_ids: list, hyp_ids: list) -> list:
+        # truncate the premise only, as the pipeline does ("only_first")
+        budget = (self.max_length
+                  - len(self._prefix) - len(self._middle) - len(self._suffix)
+                  - len(hyp_ids))
+        return (self._prefix + premise_ids[:max(budget, 0)]
+                + self._middle + hyp_ids + self._suffix)
+
+    def _entailment_logits(self, pairs: list) -> torch.Tensor:
+        batch = self.tokenizer.pad({"input_ids": pairs}, return_tensors="pt")
+        with torch.no_grad():
+            return self.model(**batch).logits
+
+    def __call__(self, sequences, candidate_labels, multi_label: bool = False,
+                 batch_size: int = 8, hypothesis_template: str = HYPOTHESIS_TEMPLATE):
+        single = isinstance(sequences, str)
+        if single:
+            sequences = [sequences]
+        if isinstance(candidate_labels, str):
+            candidate_labels = [candidate_labels]
+        if not candidate_labels:
+            raise ValueError("candidate_labels must not be empty")
+
+        hyps = self.prepare(candidate_labels, hypothesis_template)
+        n_labels = len(candidate_labels)
+        premises = self.tokenizer(
+            list(sequences), add_special_tokens=False
+        )["input_ids"]
+
+        results = []
+        step = max(1, batch_size)
+        for i in range(0, len(premises), step):
+            chunk = premises[i:i + step]
+            pairs = [self._pair_ids(p, h) for p in chunk for h in hyps]
+            logits = self._entailment_logits(pairs).view(len(chunk), n_labels, -1)
+
+            if multi_label or n_labels == 1:
+                two_way = logits[..., [self.contra_id, self.entail_id]]
+                scores = two_way.softmax(dim=-1)[..., 1]
+            else:
+                scores = logits[..., self.entail_id].softmax(dim=-1)
+
+            for seq, row in zip(sequences[i:i + step], scores.tolist()):
+                ranked = sorted(zip(candidate_labels, row),
+                                key=lambda x: x[1], reverse=True)
+                results.append({
+                    "sequence": seq,
+                    "labels":   [lbl for lbl, _ in ranked],
+                    "scores":   [sc for _, sc in ranked],
+                })
+
+        return results[0] if single else results
+
+
+def get_classifier(model_name: str = DEFAULT_MODEL,
+                   backend: str = None) -> ZeroShotClassifier:
+    """
+    Return the shared classifier for `model_name` on `backend` (default
+    ZS_BACKEND, else "torch"), loading it on first use.
+    """
+    backend = backend or os.getenv("ZS_BACKEND", "torch")
+    with _registry_lock:
+        clf = _registry.get((model_name, backend))
+        if clf is None:
+            clf = ZeroShotClassifier(model_name, backend)
+            _registry[(model_name, backend)] = clf
+    return clf
+
+
+# Fixture headlines for the backend parity/latency check below
+PARITY_HEADLINES = [
+    "Gunmen kill 12 in attack on village market",
+    "Central bank holds interest rates steady",
+    "Protesters clash with police outside parliament",
+    "Local bakery wins national bread award",
+    "Car bomb explodes near checkpoint, wounding several soldiers",
+    "School reopens after flood repairs are completed",
+]
+PARITY_LABELS = ["violent", "non-violent"]
+
+
+def compare_backends(backends, max_drift: float = 0.05) -> bool:
+    """
+    Score PARITY_HEADLINES on each backend against FP32 torch, printing the
+    largest score drift, per-item latency and resident memory. Returns
+    False if any backend drifts by more than `max_drift`. This is a quick
+    benchmark; the parity tests live in tests/test_zero_shot.py.
+    """
+    def run(clf):
+        clf(PARITY_HEADLINES[:1], PARITY_LABELS)  # warm-up
+        start = time.perf_counter()
+        out = clf(PARITY_HEADLINES, PARITY_LABELS)
+        per_item = (time.perf_counter() - start) / len(PARITY_HEADLINES)
+        return [dict(zip(r["labels"], r["scores"])) for r in out], per_item
+
+    ok = True
+    reference, _ = run(get_classifier(backend="torch"))
+    for backend in backends:
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        scores, per_item = run(get_classifier(backend=backend))
+        grown = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+        drift = max(abs(s[lbl] - r[lbl])
+                    for s, r in zip(scores, reference) for lbl in PARITY_LABELS)
+        ok &= drift <= max_drift
+        print(f"{backend:>6}: {per_item * 1000:7.1f} ms/item, "
+              f"+{grown / 1024:6.0f} MB peak RSS, max drift {drift:.4f}")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if compare_backends(sys.argv[1:] or list(BACKENDS)) else 1)